@@ -1,11 +1,21 @@
 """Streamlit web interface for Job Email Classifier"""
 
 import streamlit as st
+import os
 import time
 import logging
-from datetime import datetime
+import sqlite3
+import dataclasses
+from datetime import datetime, time as dt_time, timedelta, timezone
 from gmail_client import GmailClient
 from classifier import GroqClassifier
+from results_store import ResultStore
+from retry_queue import RetryQueue
+from scheduler import priority_score
+from leases import LeaseManager, lease_keys
+from usage_tracker import UsageTracker
+from search_index import SearchIndex
+from email_record import EmailRecord
 
 # Setup logging
 logging.basicConfig(
@@ -29,7 +39,7 @@ def init_session_state():
         st.session_state.gmail_client = GmailClient()
     if 'classifier' not in st.session_state:
         try:
-            st.session_state.classifier = GroqClassifier()
+            st.session_state.classifier = GroqClassifier(usage_tracker=UsageTracker())
         except ValueError as e:
             st.error(f"❌ {e}")
             st.info("Please create a .env file with your GROQ_API_KEY")
@@ -38,6 +48,48 @@ def init_session_state():
         st.session_state.authenticated = False
     if 'emails' not in st.session_state:
         st.session_state.emails = []
+    if 'result_store' not in st.session_state:
+        st.session_state.result_store = ResultStore()
+    if 'retry_queue' not in st.session_state:
+        st.session_state.retry_queue = RetryQueue()
+    if 'leases' not in st.session_state:
+        st.session_state.leases = LeaseManager()
+
+
+@st.cache_resource
+def get_search_index() -> SearchIndex:
+    """One index per process, shared by every session"""
+    return SearchIndex(ResultStore())
+
+
+def fetch_unlabeled(days: int, max_results: int, thread_mode: bool):
+    """Unlabeled emails, or one record per unlabeled thread in thread mode"""
+    gmail_client = st.session_state.gmail_client
+    if thread_mode:
+        return gmail_client.get_unlabeled_threads(days=days, max_results=max_results)
+    return gmail_client.get_unlabeled_emails(days=days, max_results=max_results)
+
+
+def work_id(email, thread_mode: bool) -> str:
+    """Backoff is checked per thread in thread mode"""
+    return email.thread_id if thread_mode else email.id
+
+
+def apply_category_label(email, label_id: str, thread_mode: bool):
+    """Label the email, or its whole thread, dropping a thread's previous category"""
+    gmail_client = st.session_state.gmail_client
+    if not thread_mode:
+        gmail_client.apply_label(email.id, label_id)
+        return
+    
+    if 'label_ids' not in st.session_state:
+        label_ids = [gmail_client.get_or_create_label(n) for n in GroqClassifier.LABELS.values()]
+        if not all(label_ids):
+            gmail_client.label_thread(email.thread_id, label_id)
+            return
+        st.session_state.label_ids = label_ids
+    stale = [l for l in st.session_state.label_ids if l != label_id]
+    gmail_client.label_thread(email.thread_id, label_id, remove_label_ids=stale)
 
 
 def main():
@@ -77,6 +129,9 @@ def main():
         days = st.slider("Days to check", 1, 30, 7)
         max_emails = st.slider("Max emails", 10, 100, 50)
         
+        thread_mode = st.toggle("🧵 Thread mode (one classification per conversation)",
+                                value=os.getenv('THREAD_MODE', 'false').lower() == 'true')
+        
         # Auto-process toggle
         auto_process = st.toggle("🔄 Auto-Process (continuous monitoring)", value=False)
         if auto_process:
@@ -91,10 +146,10 @@ def main():
                 with st.spinner("Fetching and classifying emails..."):
                     logging.info(f"🔍 Starting email classification - checking last {days} days")
                     
-                    emails = st.session_state.gmail_client.get_unlabeled_emails(
-                        days=days,
-                        max_results=max_emails
-                    )
+                    emails = fetch_unlabeled(days, max_emails, thread_mode)
+                    
+                    # Skip emails the background service or another session is already classifying
+                    emails = st.session_state.leases.claim_emails(emails)
                     
                     if not emails:
                         st.info("✅ No unlabeled emails found!")
@@ -103,34 +158,62 @@ def main():
                         st.info(f"📥 Found {len(emails)} emails to classify")
                         logging.info(f"📥 Found {len(emails)} emails to process")
                         
+                        # Likely action-required emails first
+                        emails.sort(key=priority_score, reverse=True)
+                        
                         # Classify and label
                         results = []
                         progress_bar = st.progress(0)
                         
-                        for i, email in enumerate(emails):
-                            category, confidence, reason = st.session_state.classifier.classify_email(email)
-                            
-                            # Apply label
-                            label_name = st.session_state.classifier.get_label_name(category)
-                            label_id = st.session_state.gmail_client.get_or_create_label(label_name)
-                            
-                            if label_id:
-                                st.session_state.gmail_client.apply_label(email['id'], label_id)
-                            
-                            # Log the classification
-                            subject = email.get('subject', 'No Subject')[:50]
-                            logging.info(f"✅ \"{subject}\": {email.get('sender', 'Unknown')} → {label_name} ({confidence:.0%})")
-                            
-                            results.append({
-                                'email': email,
-                                'category': category,
-                                'confidence': confidence,
-                                'reason': reason,
-                                'label': label_name
-                            })
+                        deferred = 0
+                        
+                        classifier = st.session_state.classifier
+                        for start in range(0, len(emails), classifier.batch_size):
+                            batch = emails[start:start + classifier.batch_size]
+                            # One request per batch through the daemon
+                            for email, result in zip(batch, classifier.classify_batch(batch)):
+                                if 'error' in result:
+                                    # Stays unlabeled until a real answer arrives
+                                    st.session_state.retry_queue.defer(email.id, result['error'], email.thread_id)
+                                    deferred += 1
+                                    continue
+                                
+                                category, confidence, reason = result['category'], result['confidence'], result['reason']
+                                
+                                # Apply label
+                                label_name = classifier.get_label_name(category)
+                                label_id = st.session_state.gmail_client.get_or_create_label(label_name)
+                                
+                                if label_id:
+                                    apply_category_label(email, label_id, thread_mode)
+                                
+                                # Log the classification
+                                subject = email.subject[:50]
+                                logging.info(f"✅ \"{subject}\": {email.sender} → {label_name} ({confidence:.0%})")
+                                
+                                st.session_state.result_store.append(
+                                    email, category, confidence, reason, result['stats']
+                                )
+                                
+                                results.append({
+                                    # The dashboard never shows the body, so don't keep it in the session
+                                    'email': dataclasses.replace(email, body=''),
+                                    'category': category,
+                                    'confidence': confidence,
+                                    'reason': reason,
+                                    'label': label_name
+                                })
+                                st.session_state.retry_queue.resolve(email.id, email.thread_id if thread_mode else '')
                             
-                            progress_bar.progress((i + 1) / len(emails))
+                            progress_bar.progress(min(start + classifier.batch_size, len(emails)) / len(emails))
+                        
+                        st.session_state.leases.release(lease_keys(emails))
+                        
+                        if deferred:
+                            st.warning(f"⏸️ {deferred} emails could not be classified right now and were left unlabeled")
+                            logging.warning(f"⏸️ Deferred {deferred} emails for retry")
                         
+                        st.session_state.result_store.flush()
                         st.session_state.emails = results
                         logging.info(f"🎉 Completed processing {len(emails)} emails")
                         st.success(f"✅ Classified and labeled {len(results)} emails!")
@@ -150,25 +233,50 @@ def main():
                 with st.spinner("Auto-processing emails..."):
                     logging.info(f"🔄 Auto-check starting - checking last {days} days")
                     
-                    emails = st.session_state.gmail_client.get_unlabeled_emails(
-                        days=days,
-                        max_results=max_emails
-                    )
+                    emails = fetch_unlabeled(days, max_emails, thread_mode)
+                    
+                    emails = st.session_state.leases.claim_emails(emails)
                     
                     if emails:
                         logging.info(f"📥 Auto-process found {len(emails)} emails")
+                        emails.sort(key=priority_score, reverse=True)
                         
-                        for email in emails:
-                            category, confidence, reason = st.session_state.classifier.classify_email(email)
-                            label_name = st.session_state.classifier.get_label_name(category)
-                            label_id = st.session_state.gmail_client.get_or_create_label(label_name)
-                            
-                            if label_id:
-                                st.session_state.gmail_client.apply_label(email['id'], label_id)
-                            
-                            subject = email.get('subject', 'No Subject')[:50]
-                            logging.info(f"✅ \"{subject}\": {email.get('sender', 'Unknown')} → {label_name} ({confidence:.0%})")
+                        deferred = 0
+                        # Emails still backing off or given up on are left for later
+                        retry_queue = st.session_state.retry_queue
+                        ready = [e for e in emails
+                                 if not retry_queue.is_waiting(work_id(e, thread_mode), thread=thread_mode)
+                                 and not retry_queue.is_abandoned(e.id)]
+                        
+                        classifier = st.session_state.classifier
+                        for start in range(0, len(ready), classifier.batch_size):
+                            batch = ready[start:start + classifier.batch_size]
+                            for email, result in zip(batch, classifier.classify_batch(batch)):
+                                if 'error' in result:
+                                    retry_queue.defer(email.id, result['error'], email.thread_id)
+                                    deferred += 1
+                                    continue
+                                category, confidence, reason = result['category'], result['confidence'], result['reason']
+                                label_name = classifier.get_label_name(category)
+                                label_id = st.session_state.gmail_client.get_or_create_label(label_name)
+                                
+                                if label_id:
+                                    apply_category_label(email, label_id, thread_mode)
+                                
+                                subject = email.subject[:50]
+                                logging.info(f"✅ \"{subject}\": {email.sender} → {label_name} ({confidence:.0%})")
+                                
+                                st.session_state.result_store.append(
+                                    email, category, confidence, reason, result['stats']
+                                )
+                                retry_queue.resolve(email.id, email.thread_id if thread_mode else '')
+                        
+                        st.session_state.leases.release(lease_keys(emails))
                         
+                        if deferred:
+                            logging.warning(f"⏸️ Auto-process deferred {deferred} emails for retry")
+                        
+                        st.session_state.result_store.flush()
                         st.success(f"🔄 Auto-processed {len(emails)} emails!")
                         logging.info(f"🎉 Auto-process completed {len(emails)} emails")
                     else:
@@ -195,6 +303,9 @@ def main():
         display_results(st.session_state.emails)
     else:
         display_welcome()
+    
+    st.divider()
+    display_search()
 
 
 def display_results(results):
@@ -270,13 +381,13 @@ def display_email_list(results):
             'other': '📦'
         }.get(category, '📧')
         
-        with st.expander(f"{emoji} {email['subject'][:70]}..."):
+        with st.expander(f"{emoji} {email.subject[:70]}..."):
             col1, col2 = st.columns([2, 1])
             
             with col1:
-                st.write(f"**From:** {email['sender']}")
-                st.write(f"**Date:** {email['date']}")
-                st.write(f"**Preview:** {email['snippet'][:200]}...")
+                st.write(f"**From:** {email.sender}")
+                st.write(f"**Date:** {email.date}")
+                st.write(f"**Preview:** {email.snippet[:200]}...")
             
             with col2:
                 st.metric("Category", label)
@@ -284,6 +395,62 @@ def display_email_list(results):
                 st.caption(f"💭 {reason}")
 
 
+def display_search():
+    """Search every stored classification without touching Gmail"""
+    st.header("🔎 Search Past Emails")
+    
+    index = get_search_index()
+    try:
+        # Only reads Parquet parts written since the last search
+        index.sync()
+    except sqlite3.Error as e:
+        # Still searchable, just without the newest results
+        logging.error(f"❌ Error syncing search index: {e}")
+        st.warning("⚠️ Couldn't refresh the search index, recent results may be missing")
+    
+    text = st.text_input("Search subject, sender, preview or reason", placeholder="interview acme")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        categories = st.multiselect(
+            "Category",
+            list(GroqClassifier.LABELS),
+            format_func=lambda c: GroqClassifier.LABELS[c]
+        )
+    with col2:
+        today = datetime.now().date()
+        dates = st.date_input("Received", value=(today - timedelta(days=30), today))
+    with col3:
+        min_confidence = st.slider("Minimum confidence", 0.0, 1.0, 0.0, 0.05)
+    
+    # The range picker returns a single date until both ends are chosen
+    since = until = None
+    if isinstance(dates, (list, tuple)) and len(dates) == 2:
+        since = datetime.combine(dates[0], dt_time.min, tzinfo=timezone.utc)
+        until = datetime.combine(dates[1] + timedelta(days=1), dt_time.min, tzinfo=timezone.utc)
+    
+    started = time.perf_counter()
+    rows = index.search(text, categories, since=since, until=until, min_confidence=min_confidence)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    st.caption(f"{len(rows)} of {len(index)} emails shown ({elapsed_ms:.0f} ms)")
+    
+    display_email_list([
+        {
+            'email': EmailRecord(
+                id=row['message_id'],
+                subject=row['subject'],
+                sender=row['sender'],
+                date=row['date'],
+                snippet=row['snippet']
+            ),
+            'category': row['category'],
+            'confidence': row['confidence'],
+            'reason': row['reason'],
+            'label': GroqClassifier.LABELS.get(row['category'], row['category'])
+        }
+        for row in rows
+    ])
+
+
 def display_welcome():
     """Display welcome screen"""
     st.info("👈 Connect to Gmail and click 'Classify Emails' to get started!")
@@ -0,0 +1,199 @@
+"""Chat-completion backends the classifier can run on"""
+
+import os
+import re
+import json
+import time
+import threading
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from typing import Dict, List
+
+
+@dataclass
+class Completion:
+    """Text returned by a backend plus its token usage"""
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class BackendError(Exception):
+    """A backend request failed"""
+
+
+class RateLimitedError(BackendError):
+    """The backend asked us to slow down (HTTP 429)"""
+
+
+class ClassifierBackend:
+    """Base class: one chat-completion API plus the limits it should be driven at"""
+
+    name = 'base'
+    default_model = ''
+
+    def __init__(self, max_concurrency: int = 1, requests_per_minute: float = 30):
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def complete(self, model: str, messages: List[Dict], max_tokens: int,
+                 json_mode: bool = False) -> Completion:
+        """Run one completion, never more than max_concurrency at a time"""
+        with self._slots:
+            return self._complete(model, messages, max_tokens, json_mode)
+
+    def _complete(self, model: str, messages: List[Dict], max_tokens: int,
+                  json_mode: bool) -> Completion:
+        raise NotImplementedError
+
+
+class GroqBackend(ClassifierBackend):
+    """Groq's hosted API (free tier: roughly 30 requests/minute)"""
+
+    name = 'groq'
+
+    def __init__(self):
+        super().__init__(
+            max_concurrency=int(os.getenv('GROQ_MAX_CONCURRENCY', '1')),
+            requests_per_minute=float(os.getenv('GROQ_RPM', '30'))
+        )
+        api_key = os.getenv('GROQ_API_KEY')
+        if not api_key:
+            raise ValueError("GROQ_API_KEY not found in .env file")
+
+        from groq import Groq
+        self.client = Groq(api_key=api_key)
+        self.default_model = os.getenv('GROQ_MODEL', 'openai/gpt-oss-20b')
+
+    def _complete(self, model, messages, max_tokens, json_mode):
+        options = {'temperature': 0.1, 'max_tokens': max_tokens}
+        if json_mode:
+            options['response_format'] = {'type': 'json_object'}
+
+        try:
+            response = self.client.chat.completions.create(model=model, messages=messages, **options)
+        except Exception as e:
+            if "429" in str(e):
+                raise RateLimitedError(str(e)) from e
+            raise BackendError(str(e)) from e
+
+        try:
+            usage = response.usage
+            return Completion(
+                text=(response.choices[0].message.content or '').strip(),
+                prompt_tokens=usage.prompt_tokens if usage else 0,
+                completion_tokens=usage.completion_tokens if usage else 0
+            )
+        except (IndexError, TypeError, AttributeError) as e:
+            raise BackendError(f"Malformed response from Groq: {e!r}") from e
+
+
+class OpenAICompatibleBackend(ClassifierBackend):
+    """Any server speaking the OpenAI chat API, e.g. a local llama.cpp or vLLM server"""
+
+    name = 'openai'
+
+    def __init__(self, base_url: str = None, api_key: str = None):
+        super().__init__(
+            max_concurrency=int(os.getenv('OPENAI_MAX_CONCURRENCY', '4')),
+            requests_per_minute=float(os.getenv('OPENAI_RPM', '600'))
+        )
+        self.base_url = (base_url or os.getenv('OPENAI_BASE_URL', 'http://localhost:8080/v1')).rstrip('/')
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY', '')
+        self.timeout = float(os.getenv('OPENAI_TIMEOUT_SECONDS', '120'))
+        self.default_model = os.getenv('OPENAI_MODEL', 'local-model')
+
+    def _complete(self, model, messages, max_tokens, json_mode):
+        payload = {'model': model, 'messages': messages, 'temperature': 0.1, 'max_tokens': max_tokens}
+        if json_mode:
+            payload['response_format'] = {'type': 'json_object'}
+
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f'Bearer {self.api_key}'
+        request = urllib.request.Request(
+            f'{self.base_url}/chat/completions',
+            data=json.dumps(payload).encode('utf-8'),
+            headers=headers,
+            method='POST'
+        )
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise RateLimitedError(f"429 from {self.base_url}") from e
+            raise BackendError(f"HTTP {e.code} from {self.base_url}") from e
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise BackendError(f"{self.base_url}: {e}") from e
+
+        try:
+            usage = data.get('usage') or {}
+            return Completion(
+                text=(data['choices'][0]['message'].get('content') or '').strip(),
+                prompt_tokens=usage.get('prompt_tokens', 0),
+                completion_tokens=usage.get('completion_tokens', 0)
+            )
+        except (KeyError, IndexError, TypeError, AttributeError) as e:
+            # Malformed or empty reply: a backend failure like any other
+            raise BackendError(f"Malformed response from {self.base_url}: {e!r}") from e
+
+
+class MockBackend(ClassifierBackend):
+    """In-process keyword classifier for load tests and offline runs - no API calls"""
+
+    name = 'mock'
+    default_model = 'mock'
+
+    RULES = [
+        ('followup_required', ('interview', 'offer', 'next steps', 'availability', 'assessment')),
+        ('application_submitted', ('application', 'applying', 'applied', 'received your')),
+    ]
+
+    def __init__(self, latency_ms: float = None):
+        super().__init__(
+            max_concurrency=int(os.getenv('MOCK_MAX_CONCURRENCY', '32')),
+            requests_per_minute=float(os.getenv('MOCK_RPM', '60000'))
+        )
+        self.latency_ms = latency_ms if latency_ms is not None else float(os.getenv('MOCK_LATENCY_MS', '0'))
+
+    def _complete(self, model, messages, max_tokens, json_mode):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        prompt = messages[-1]['content']
+        # Only look at the email itself, not the few-shot examples
+        email_text = prompt.split('**Now classify this email:**')[-1].split('**Key Classification Rules:**')[0].lower()
+
+        category, confidence = 'other', 0.9
+        if re.search(r'job alert|jobs for you|newsletter|unsubscribe', email_text) is None:
+            for rule_category, keywords in self.RULES:
+                if any(keyword in email_text for keyword in keywords):
+                    category, confidence = rule_category, 0.75
+                    break
+
+        if json_mode:
+            codes = {'application_submitted': 'A', 'followup_required': 'F', 'other': 'O'}
+            text = json.dumps({'c': codes[category], 'p': confidence, 'r': 'Mock keyword match'})
+        else:
+            text = f"CLASSIFICATION: {category}\nCONFIDENCE: {confidence}\nREASON: Mock keyword match"
+
+        return Completion(text=text, prompt_tokens=len(prompt) // 4, completion_tokens=len(text) // 4)
+
+
+BACKENDS = {
+    'groq': GroqBackend,
+    'openai': OpenAICompatibleBackend,
+    'mock': MockBackend,
+}
+
+
+def create_backend(name: str = None) -> ClassifierBackend:
+    """Backend selected by name or CLASSIFIER_BACKEND (default: groq)"""
+    name = (name or os.getenv('CLASSIFIER_BACKEND', 'groq')).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown CLASSIFIER_BACKEND '{name}' (choose from: {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""Resumable backfill that labels a long date range of existing mail"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List
+
+from gmail_client import GmailClient, UNLABELED_QUERY
+from backends import ClassifierBackend, create_backend
+from classifier import GroqClassifier
+from rate_limiter import CircuitBreaker, RateLimiter
+from results_store import ResultStore
+from retry_queue import RetryQueue
+from leases import LeaseManager, lease_keys
+from usage_tracker import QuotaPlanner, UsageTracker
+
+# Bulk-label mail excluded by category/sender prefilters without classifying it
+AUTO_CLUTTER = os.getenv('PREFILTER_AUTO_CLUTTER', 'false').lower() == 'true'
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('classifier.log'),
+        logging.StreamHandler()
+    ]
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Label historical mail in resumable date shards')
+    parser.add_argument('--days', type=int, default=365, help='How far back to go (default: 365)')
+    parser.add_argument('--start', help='Start date YYYY-MM-DD (overrides --days)')
+    parser.add_argument('--end', help='End date YYYY-MM-DD, exclusive (default: tomorrow)')
+    parser.add_argument('--shard-days', type=int, default=7, help='Days per shard (default: 7)')
+    parser.add_argument('--workers', type=int, default=3, help='Parallel shard workers (default: 3)')
+    parser.add_argument('--rpm', type=float,
+                        help="LLM requests per minute shared by all workers (default: the backend's limit)")
+    parser.add_argument('--state', default='backfill_state.json', help='Checkpoint file')
+    parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+    parser.add_argument('--retry-wait', type=float, default=900,
+                        help='Wait up to this many seconds for deferred emails to come due before '
+                             'leaving a shard for the next run (default: 900)')
+    return parser.parse_args()
+
+
+def make_shards(start: date, end: date, shard_days: int) -> List[Dict]:
+    """Split [start, end) into shards, newest first so recent mail is labeled early"""
+    shards = []
+    shard_end = end
+    while shard_end > start:
+        shard_start = max(start, shard_end - timedelta(days=shard_days))
+        shards.append({
+            'after': shard_start.isoformat(),
+            'before': shard_end.isoformat(),
+            'status': 'pending',
+            'processed': 0,
+            'deferred': 0,
+            'seconds': 0.0
+        })
+        shard_end = shard_start
+    return shards
+
+
+class Checkpoint:
+    """Per-shard progress persisted to JSON after every update"""
+
+    def __init__(self, path: str, start: date, end: date, shard_days: int, shards: List[Dict]):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.shard_days = shard_days
+        self.shards = shards
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load_or_create(cls, path: str, start: date, end: date, shard_days: int,
+                       restart: bool = False) -> 'Checkpoint':
+        """Resume the checkpoint at path if it covers the same range"""
+        if os.path.exists(path) and not restart:
+            with open(path) as f:
+                state = json.load(f)
+            if (state['start'], state['end'], state['shard_days']) == (start.isoformat(), end.isoformat(), shard_days):
+                return cls(path, start, end, shard_days, state['shards'])
+            logging.warning("⚠️ Checkpoint is for a different range, starting over")
+
+        checkpoint = cls(path, start, end, shard_days, make_shards(start, end, shard_days))
+        checkpoint.save()
+        return checkpoint
+
+    def update(self, shard: Dict, **changes):
+        """Apply changes to a shard and persist immediately"""
+        with self._lock:
+            shard.update(changes)
+            self.save()
+
+    def save(self):
+        state = {
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'shard_days': self.shard_days,
+            'shards': self.shards
+        }
+        # Write then rename so an interrupted save never corrupts the checkpoint
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def pending(self) -> List[Dict]:
+        return [s for s in self.shards if s['status'] != 'done']
+
+
+class Progress:
+    """Throughput and ETA measured over this run"""
+
+    def __init__(self, checkpoint: Checkpoint):
+        self.checkpoint = checkpoint
+        self.started = time.monotonic()
+        self.emails = 0
+        self.deferred = 0
+        self.shards_done = 0
+        self._lock = threading.Lock()
+
+    def shard_finished(self, processed: int, deferred: int = 0):
+        with self._lock:
+            self.emails += processed
+            self.deferred += deferred
+            self.shards_done += 1
+            elapsed = time.monotonic() - self.started
+            remaining = len(self.checkpoint.pending())
+
+        per_minute = self.emails / elapsed * 60 if elapsed else 0.0
+        # Wall-clock time per finished shard already reflects parallel workers
+        eta = timedelta(seconds=int(elapsed / self.shards_done * remaining))
+        logging.info(
+            f"📊 {self.shards_done} shards, {self.emails} emails this run "
+            f"({per_minute:.1f}/min, {self.deferred} deferred) - {remaining} shards left, ETA {eta}"
+        )
+
+
+def process_shard(shard: Dict, label_ids: Dict[str, str], checkpoint: Checkpoint,
+                  progress: Progress, backend: ClassifierBackend, rate_limiter: RateLimiter, breaker: CircuitBreaker,
+                  result_store: ResultStore, retry_queue: RetryQueue, leases: LeaseManager,
+                  planner: QuotaPlanner, retry_wait: float, stop: threading.Event):
+    """Label every unlabeled message in one shard"""
+    if stop.is_set():
+        return
+
+    # Google API clients are not thread-safe, so each shard gets its own
+    gmail_client = GmailClient()
+    gmail_client.authenticate()
+    classifier = GroqClassifier(rate_limiter=rate_limiter, breaker=breaker, backend=backend,
+                                usage_tracker=planner.tracker)
+
+    after = shard['after'].replace('-', '/')
+    before = shard['before'].replace('-', '/')
+    base_query = f'after:{after} before:{before} {UNLABELED_QUERY}'
+    query = gmail_client.query_builder.build(base_query)
+
+    logging.info(f"🔍 Shard {shard['after']} → {shard['before']} starting")
+    checkpoint.update(shard, status='running')
+
+    clutter_query = gmail_client.query_builder.clutter_query(base_query)
+    if AUTO_CLUTTER and clutter_query:
+        cluttered = gmail_client.label_all_matching(clutter_query, label_ids['other'], limit=100000)
+        logging.info(f"📦 Prefilter labeled {cluttered} emails as clutter")
+    started = time.monotonic()
+    processed = 0
+    # IDs this worker has claimed and tried (labeled or deferred), or found backing off
+    seen = set()
+    # IDs in this shard waiting on the retry queue
+    deferred = set()
+
+    # Labeling shifts the query's pages under us, so walk every page per pass and
+    # repeat passes until one finds nothing left to try
+    while True:
+        page_token = None
+        tried = 0
+        busy = 0
+        listed = set()
+        while True:
+            message_ids, page_token = gmail_client.list_messages(query, max_results=100, page_token=page_token)
+            listed.update(message_ids)
+            new_ids = [m for m in message_ids if m not in seen]
+            # Mail that failed RETRY_MAX_ATTEMPTS times is left unlabeled; mail still
+            # backing off (here or in another process) is retried once due, below
+            waiting = {m for m in new_ids if retry_queue.is_waiting(m)}
+            skipped = waiting | {m for m in new_ids if retry_queue.is_abandoned(m)}
+            seen.update(skipped)
+            deferred.update(waiting)
+            new_ids = [m for m in new_ids if m not in skipped]
+
+            # Emails leased by another worker, or in a thread a thread-mode worker is on,
+            # are tried on a later pass if still unlabeled
+            claimed = leases.claim(new_ids)
+            fetched = gmail_client.get_emails(claimed)
+            emails = leases.claim_emails(fetched)
+            blocked = {e.id for e in fetched} - {e.id for e in emails}
+            busy += len(new_ids) - len(claimed) + len(blocked)
+            attempted = [m for m in claimed if m not in blocked]
+            seen.update(attempted)
+            tried += len(attempted)
+
+            labeled = 0
+            for start in range(0, len(emails), classifier.batch_size):
+                # Old mail can wait; leave the remaining quota to the background service
+                while planner.exhausted() and not stop.is_set():
+                    logging.warning("🪙 Daily token quota nearly used up, pausing backfill for 10 minutes")
+                    stop.wait(600)
+                if stop.is_set():
+                    break
+                batch = emails[start:start + classifier.batch_size]
+                # One request per batch through the daemon
+                for email, result in zip(batch, classifier.classify_batch(batch)):
+                    try:
+                        if 'error' in result:
+                            if retry_queue.defer(email.id, result['error'], email.thread_id):
+                                deferred.add(email.id)
+                            else:
+                                deferred.discard(email.id)
+                        elif gmail_client.apply_label(email.id, label_ids[result['category']]):
+                            labeled += 1
+                            result_store.append(email, result['category'], result['confidence'],
+                                                result['reason'], result['stats'])
+                            retry_queue.resolve(email.id)
+                            deferred.discard(email.id)
+                    except Exception as e:
+                        logging.error(f"❌ Error processing email: {e}")
+                if breaker.is_open:
+                    # No deadline here, so wait out the cooldown instead of deferring the whole shard
+                    stop.wait(breaker.cooldown_seconds)
+
+            leases.release(claimed + lease_keys(emails))
+            processed += labeled
+            if claimed:
+                checkpoint.update(shard, processed=shard['processed'] + labeled, deferred=len(deferred),
+                                  seconds=shard['seconds'] + time.monotonic() - started)
+                started = time.monotonic()
+
+            if stop.is_set():
+                result_store.flush()
+                return
+            if not page_token:
+                break
+
+        if tried:
+            continue
+        if busy:
+            # Only mail other workers are holding is left; done once they label it
+            logging.info(f"🔒 Shard {shard['after']} → {shard['before']}: waiting on {busy} leased emails")
+            stop.wait(60)
+            if stop.is_set():
+                result_store.flush()
+                return
+            continue
+
+        # Everything listed has been tried. Deferred mail that is no longer listed was
+        # labeled elsewhere; the rest is retried here when due, unless that is too far off
+        deferred = {m for m in deferred if m in listed and m in retry_queue and not retry_queue.is_abandoned(m)}
+        if not deferred:
+            break
+        wait = retry_queue.next_retry(list(deferred)) - time.time()
+        if wait > retry_wait:
+            break
+        logging.info(f"⏸️ Shard {shard['after']} → {shard['before']}: retrying {len(deferred)} deferred emails "
+                     f"in {max(wait, 0):.0f}s")
+        stop.wait(max(wait, 0))
+        if stop.is_set():
+            result_store.flush()
+            return
+        seen -= {m for m in deferred if not retry_queue.is_waiting(m)}
+
+    # A shard with deferred mail stays pending, so a rerun retries it
+    checkpoint.update(shard, status='deferred' if deferred else 'done', deferred=len(deferred))
+    result_store.flush()
+    if deferred:
+        logging.warning(f"⏸️ Shard {shard['after']} → {shard['before']} finished with {len(deferred)} "
+                        f"emails deferred ({processed} labeled)")
+    else:
+        logging.info(f"✅ Shard {shard['after']} → {shard['before']} done ({processed} labeled)")
+    progress.shard_finished(processed, len(deferred))
+
+
+def main():
+    args = parse_args()
+
+    end = date.fromisoformat(args.end) if args.end else date.today() + timedelta(days=1)
+    start = date.fromisoformat(args.start) if args.start else end - timedelta(days=args.days + 1)
+
+    checkpoint = Checkpoint.load_or_create(args.state, start, end, args.shard_days, args.restart)
+    pending = checkpoint.pending()
+
+    print("🚀 Job Email Classifier - Backfill")
+    print("=" * 50)
+    print(f"📅 {start} → {end} in {len(checkpoint.shards)} shards of {args.shard_days} days")
+    print(f"⏯️  {len(pending)} shards left, {args.workers} workers")
+    print("=" * 50)
+
+    if not pending:
+        print("✅ Nothing left to backfill")
+        return
+
+    gmail_client = GmailClient()
+    if not gmail_client.authenticate():
+        print("❌ Gmail authentication failed")
+        return
+
+    # Resolve labels once instead of listing them for every email
+    label_ids = {}
+    for category, label_name in GroqClassifier.LABELS.items():
+        label_ids[category] = gmail_client.get_or_create_label(label_name)
+        if not label_ids[category]:
+            print(f"❌ Could not create label {label_name}")
+            return
+
+    daemon_url = os.getenv('CLASSIFIER_DAEMON_URL')
+    if daemon_url:
+        # The daemon enforces the request budget it shares with the other front ends
+        backend = rate_limiter = None
+        print(f"🤖 Classifying through the daemon at {daemon_url}")
+    else:
+        # One backend for all workers so its concurrency limit holds across them
+        try:
+            backend = create_backend()
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        rpm = args.rpm or backend.requests_per_minute
+        rate_limiter = RateLimiter(rpm)
+        print(f"🤖 Backend {backend.name}: {rpm:g} requests/min, {backend.max_concurrency} concurrent")
+    breaker = CircuitBreaker()
+    result_store = ResultStore()
+    retry_queue = RetryQueue()
+    leases = LeaseManager()
+    planner = QuotaPlanner(UsageTracker())
+    progress = Progress(checkpoint)
+    stop = threading.Event()
+
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    futures = [
+        pool.submit(process_shard, shard, label_ids, checkpoint, progress,
+                    backend, rate_limiter, breaker, result_store, retry_queue, leases, planner,
+                    args.retry_wait, stop)
+        for shard in pending
+    ]
+    try:
+        for future in futures:
+            future.result()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping after the current emails - progress is saved, rerun to resume")
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        return
+    finally:
+        pool.shutdown(wait=True)
+
+    left = [s for s in checkpoint.shards if s['status'] == 'deferred']
+    if left:
+        deferred = sum(s.get('deferred', 0) for s in left)
+        print(f"⏸️  Backfill finished: {progress.emails} emails labeled this run, {deferred} still deferred "
+              f"in {len(left)} shards - rerun to retry them")
+    else:
+        print(f"✅ Backfill complete: {progress.emails} emails labeled this run")
+
+
+if __name__ == "__main__":
+    main()
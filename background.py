@@ -5,14 +5,21 @@ import os
 import time
 import logging
 import argparse
+import dataclasses
 from datetime import datetime
 from gmail_client import GmailClient
 from classifier import GroqClassifier
+from results_store import ResultStore
+from retry_queue import RetryQueue
+from scheduler import PriorityScheduler
+from leases import LeaseManager, lease_keys
+from usage_tracker import QuotaPlanner, UsageTracker
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Job Email Classifier Background Service')
     parser.add_argument('--days', type=int, help='Number of days to check for emails (overrides env var)')
     parser.add_argument('--interval', type=int, help='Check interval in minutes (overrides env var)')
+    parser.add_argument('--threads', action='store_true', help='Classify whole threads instead of single messages')
     return parser.parse_args()
 
 # Parse command line arguments
@@ -22,6 +29,10 @@ args = parse_args()
 CHECK_INTERVAL_MINUTES = args.interval or int(os.getenv('CHECK_INTERVAL_MINUTES', '15'))
 DAYS_TO_CHECK = args.days or int(os.getenv('DAYS_TO_CHECK', '1'))
 MAX_EMAILS = int(os.getenv('MAX_EMAILS', '50'))
+# Bulk-label mail excluded by category/sender prefilters without classifying it
+AUTO_CLUTTER = os.getenv('PREFILTER_AUTO_CLUTTER', 'false').lower() == 'true'
+# One classification per conversation, labeling every message in it
+THREAD_MODE = args.threads or os.getenv('THREAD_MODE', 'false').lower() == 'true'
 
 # Setup logging
 logging.basicConfig(
@@ -34,48 +45,197 @@ logging.basicConfig(
 )
 
 
-def process_emails(gmail_client: GmailClient, classifier: GroqClassifier) -> int:
-    """Process unlabeled emails"""
+def _work_id(email) -> str:
+    """ID a unit of work is tracked by: the thread in thread mode, else the message"""
+    return email.thread_id if THREAD_MODE else email.id
+
+
+def process_emails(gmail_client: GmailClient, classifier: GroqClassifier,
+                   result_store: ResultStore = None, retry_queue: RetryQueue = None,
+                   scheduler: PriorityScheduler = None, leases: LeaseManager = None,
+                   planner: QuotaPlanner = None) -> int:
+    """Process unlabeled emails, likely action-required ones first
+    
+    In thread mode the listed and carried-over IDs are thread IDs and each
+    thread is classified once from its latest message. Leases cover both the
+    message and its thread, so backfill and message-mode app sessions never
+    classify the same conversation alongside us.
+    """
+    claimed = []
     try:
-        # Fetch unlabeled emails
-        emails = gmail_client.get_unlabeled_emails(
-            days=DAYS_TO_CHECK,
-            max_results=MAX_EMAILS
-        )
+        if scheduler:
+            scheduler.start_cycle()
+        
+        clutter_query = gmail_client.clutter_query(DAYS_TO_CHECK)
+        if AUTO_CLUTTER and clutter_query:
+            label_id = gmail_client.get_or_create_label(classifier.get_label_name('other'))
+            cluttered = gmail_client.label_all_matching(clutter_query, label_id) if label_id else 0
+            if cluttered:
+                logging.info(f"📦 Prefilter labeled {cluttered} emails as clutter")
+        
+        # List unlabeled emails
+        list_ids = gmail_client.list_threads if THREAD_MODE else gmail_client.list_messages
+        message_ids, _ = list_ids(gmail_client.unlabeled_query(DAYS_TO_CHECK), max_results=MAX_EMAILS)
+        
+        # Work carried over from the last cycle and deferred emails that are due,
+        # even if they fell outside the query window
+        extra = scheduler.take_carryover() if scheduler else []
+        due = []
+        if retry_queue is not None:
+            # Capped like the listing, so a large backlog (e.g. after an outage) drains over several cycles
+            due = retry_queue.due(threads=THREAD_MODE, limit=MAX_EMAILS)
+            extra += due
+        message_ids += [m for m in dict.fromkeys(extra) if m not in message_ids]
         
-        if not emails:
+        if retry_queue is not None:
+            message_ids = [m for m in message_ids if not retry_queue.is_waiting(m, thread=THREAD_MODE)]
+        
+        if leases and message_ids:
+            # Skip emails another worker (app, backfill, second replica) is on
+            claimed = leases.claim(message_ids)
+            if len(claimed) < len(message_ids):
+                logging.info(f"🔒 {len(message_ids) - len(claimed)} emails are leased by another worker")
+            message_ids = claimed
+        
+        if not message_ids:
             logging.info("✅ No unlabeled emails found")
             return 0
         
-        logging.info(f"📥 Found {len(emails)} emails to process")
+        logging.info(f"📥 Found {len(message_ids)} emails to process")
+        
+        # Score from headers before downloading any bodies
+        if THREAD_MODE:
+            emails = gmail_client.get_thread_summaries(message_ids)
+            # Resolve all our labels once so a reclassified thread loses its old one
+            label_ids = {c: gmail_client.get_or_create_label(n) for c, n in classifier.LABELS.items()}
+        else:
+            emails = gmail_client.get_email_summaries(message_ids)
+        if retry_queue is not None:
+            # Deleted or inaccessible mail would otherwise come back as due every cycle;
+            # backing it off lets it run out of attempts
+            fetched_ids = {_work_id(e) for e in emails}
+            for missing in set(due) & (set(message_ids) - fetched_ids):
+                if THREAD_MODE:
+                    retry_queue.defer_thread(missing, "Could not fetch thread")
+                else:
+                    retry_queue.defer(missing, "Could not fetch message")
+            # Failed RETRY_MAX_ATTEMPTS times: stays unlabeled instead of being retried forever
+            emails = [e for e in emails if not retry_queue.is_abandoned(e.id)]
+        if leases:
+            # Now that each email's message and thread ID are known, hold both
+            held = leases.claim_emails(emails)
+            if len(held) < len(emails):
+                logging.info(f"🔒 {len(emails) - len(held)} emails belong to a conversation another worker is on")
+            emails = held
+            claimed += lease_keys(emails)
+        if scheduler:
+            emails = scheduler.order(emails)
+        
+        # Cheaper tiers for low-priority mail when the backlog won't fit the daily quota
+        plan = planner.plan(emails) if planner else {}
         
         # Process each email
         processed = 0
-        for email in emails:
+        deferred = 0
+        waiting_for_quota = 0
+        for start in range(0, len(emails), classifier.batch_size):
+            if scheduler and scheduler.out_of_time():
+                carried = [_work_id(e) for e in emails[start:]]
+                scheduler.carry_over(carried)
+                logging.warning(f"⏱️ Cycle budget used up, carrying {len(carried)} lower-priority emails to the next cycle")
+                break
+            
+            batch = []
+            for summary in emails[start:start + classifier.batch_size]:
+                tier = plan.get(summary.id, 'full')
+                if tier == 'defer':
+                    # Still unlabeled, so it is listed again once quota frees up
+                    waiting_for_quota += 1
+                    continue
+                batch.append((summary, tier))
+            
             try:
-                # Classify
-                category, confidence, reason = classifier.classify_email(email)
-                
-                # Get label
-                label_name = classifier.get_label_name(category)
-                label_id = gmail_client.get_or_create_label(label_name)
-                
-                # Apply label
-                if label_id:
-                    gmail_client.apply_label(email['id'], label_id)
-                    processed += 1
-                    logging.info(
-                        f"✅ {email['subject'][:50]}... → {label_name} ({confidence:.0%})"
-                    )
-                
+                fetched = {e.id: e for e in gmail_client.get_emails([summary.id for summary, _ in batch])}
             except Exception as e:
-                logging.error(f"❌ Error processing email: {e}")
+                logging.error(f"❌ Error fetching emails: {e}")
+                continue
+            
+            # One classify_batch call (one daemon request) per tier
+            for cheap in (False, True):
+                group = []
+                for summary, tier in batch:
+                    if (tier == 'cheap') != cheap or summary.id not in fetched:
+                        continue
+                    email = fetched[summary.id]
+                    if THREAD_MODE:
+                        email = dataclasses.replace(email, history=summary.history)
+                    group.append(email)
+                if not group:
+                    continue
+                
+                for email, result in zip(group, classifier.classify_batch(group, cheap=cheap)):
+                    try:
+                        if 'error' in result:
+                            # Leave it unlabeled; it is retried once its backoff expires
+                            deferred += 1
+                            if retry_queue is not None and not retry_queue.defer(email.id, result['error'], email.thread_id):
+                                logging.warning(f"⚠️ Giving up on {email.subject[:50]}... after repeated failures, "
+                                                f"leaving it unlabeled")
+                            continue
+                        
+                        category, confidence, reason = result['category'], result['confidence'], result['reason']
+                        tiers = result['stats'].get('tiers', [])
+                        if len(tiers) > 1:
+                            logging.info(
+                                f"↗️ Escalated {tiers[0]['model']} ({tiers[0]['category']}, "
+                                f"{tiers[0]['confidence']:.0%}) → {tiers[-1]['model']}"
+                            )
+                        
+                        # Get label
+                        label_name = classifier.get_label_name(category)
+                        label_id = label_ids[category] if THREAD_MODE else gmail_client.get_or_create_label(label_name)
+                        
+                        # Apply label
+                        if label_id:
+                            if THREAD_MODE:
+                                stale = [l for c, l in label_ids.items() if c != category and l]
+                                labeled = gmail_client.label_thread(email.thread_id, label_id, remove_label_ids=stale)
+                            else:
+                                labeled = gmail_client.apply_label(email.id, label_id)
+                            if not labeled:
+                                # Still unlabeled, so the next cycle's query picks it up again
+                                continue
+                            processed += 1
+                            logging.info(
+                                f"✅ {email.subject[:50]}... → {label_name} ({confidence:.0%})"
+                            )
+                            
+                            if result_store:
+                                result_store.append(email, category, confidence, reason, result['stats'])
+                            if retry_queue is not None:
+                                retry_queue.resolve(email.id, email.thread_id if THREAD_MODE else '')
+                        
+                    except Exception as e:
+                        logging.error(f"❌ Error processing email: {e}")
+        
+        if deferred:
+            state = " (circuit open)" if classifier.breaker.is_open else ""
+            logging.warning(f"⏸️ Deferred {deferred} emails for retry{state}")
+        if waiting_for_quota:
+            logging.warning(f"🪙 Left {waiting_for_quota} low-priority emails for when token quota frees up")
         
         return processed
         
     except Exception as e:
         logging.error(f"❌ Error in process_emails: {e}")
         return 0
+    
+    finally:
+        if result_store:
+            result_store.flush()
+        if leases:
+            # Labeled mail drops out of the query; the rest is free for whoever gets to it next
+            leases.release(claimed)
 
 
 def main():
@@ -84,6 +244,8 @@ def main():
     print("=" * 50)
     print(f"📅 Checking emails from last {DAYS_TO_CHECK} days")
     print(f"⏰ Check interval: {CHECK_INTERVAL_MINUTES} minutes")
+    if THREAD_MODE:
+        print("🧵 Thread mode: one classification per conversation")
     print("=" * 50)
     
     # Check credentials
@@ -109,14 +271,31 @@ def main():
     
     print("🤖 Initializing Groq classifier...")
     try:
-        classifier = GroqClassifier()
-        print(f"✅ Classifier ready (model: {classifier.model})")
+        usage_tracker = UsageTracker()
+        classifier = GroqClassifier(usage_tracker=usage_tracker)
+        print(f"✅ Classifier ready (model: {classifier.model}, backend: {classifier.backend_name})")
     except ValueError as e:
         print(f"❌ {e}")
         return
     
+    result_store = ResultStore()
+    print(f"🗄️  Saving results to {result_store.path}/")
+    
+    retry_queue = RetryQueue()
+    if len(retry_queue):
+        print(f"⏸️  {len(retry_queue)} deferred emails waiting for retry")
+    if retry_queue.abandoned_count():
+        print(f"⚠️  {retry_queue.abandoned_count()} emails given up on after {retry_queue.max_attempts} attempts")
+    
+    scheduler = PriorityScheduler()
+    planner = QuotaPlanner(usage_tracker)
+    
+    leases = LeaseManager()
+    leases.purge_expired()
+    print(f"🔒 Leasing emails via {leases.path} (TTL {leases.ttl_seconds:.0f}s)")
+    
     # Start monitoring
-    print(f"⏰ Checking every {CHECK_INTERVAL_MINUTES} minutes")
+    print(f"⏰ Checking every {CHECK_INTERVAL_MINUTES} minutes (cycle budget {scheduler.budget_seconds:.0f}s)")
     print(f"📧 Processing last {DAYS_TO_CHECK} day(s) of emails")
     print("Press Ctrl+C to stop\n")
     
@@ -128,7 +307,7 @@ def main():
             logging.info(f"🔍 Starting check at {start_time.strftime('%H:%M:%S')}")
             
             # Process emails
-            processed = process_emails(gmail_client, classifier)
+            processed = process_emails(gmail_client, classifier, result_store, retry_queue, scheduler, leases, planner)
             total_processed += processed
             
             # Log stats
@@ -137,6 +316,9 @@ def main():
                 f"📊 Processed {processed} emails in {elapsed:.1f}s "
                 f"(Total: {total_processed})"
             )
+            usage = usage_tracker.summary()
+            left = f", {usage['remaining_today']:,} left" if usage['remaining_today'] is not None else ""
+            logging.info(f"🪙 {usage['last_day']:,} tokens in the last 24h{left}")
             
             # Sleep until next check
             logging.info(f"😴 Sleeping for {CHECK_INTERVAL_MINUTES} minutes...\n")
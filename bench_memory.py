@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Memory benchmark: full-body email dicts vs truncated EmailRecord"""
+
+import random
+import argparse
+import tracemalloc
+
+from email_record import EmailRecord
+
+SENDERS = [f"jobs-{i}@company{i}.com" for i in range(200)]
+
+
+def synthetic_mailbox(count: int, body_kb: int, seed: int = 42):
+    """Yield (id, subject, sender, date, snippet, body) tuples shaped like newsletter mail"""
+    rng = random.Random(seed)
+    paragraph = "Exciting new roles matching your profile are waiting for you. " * 16
+    for i in range(count):
+        # Build each body separately so strings aren't shared between emails
+        body = (f"{i} " + paragraph) * max(1, body_kb * 1024 // (len(paragraph) + 8))
+        yield (
+            f"msg{i:08d}",
+            f"Your application #{i} - Software Engineer",
+            rng.choice(SENDERS),
+            "Mon, 19 Oct 2026 10:00:00 +0000",
+            body[:200],
+            body
+        )
+
+
+def measure(build, count: int, body_kb: int):
+    """Peak and retained bytes while building the whole mailbox with build()"""
+    tracemalloc.start()
+    emails = [build(*fields) for fields in synthetic_mailbox(count, body_kb)]
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(emails), retained, peak
+
+
+def as_dict(id, subject, sender, date, snippet, body):
+    return {'id': id, 'subject': subject, 'sender': sender, 'date': date, 'body': body, 'snippet': snippet}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compare email memory usage')
+    parser.add_argument('--emails', type=int, default=2000, help='Synthetic mailbox size (default: 2000)')
+    parser.add_argument('--body-kb', type=int, default=64, help='Body size per email in KB (default: 64)')
+    parser.add_argument('--budget', type=int, default=1000, help='EmailRecord body budget (default: 1000)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print(f"📧 {args.emails} emails x {args.body_kb} KB bodies")
+
+    variants = [
+        ('dict, full body', as_dict),
+        (f'EmailRecord, {args.budget} chars', lambda *f: EmailRecord.create(*f, body_chars=args.budget)),
+    ]
+    for name, build in variants:
+        count, retained, peak = measure(build, args.emails, args.body_kb)
+        print(f"{name:<28} retained {retained / 2**20:>8.1f} MiB  "
+              f"peak {peak / 2**20:>8.1f} MiB  ({retained / count:>9,.0f} B/email)")
+
+
+if __name__ == "__main__":
+    main()
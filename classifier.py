@@ -1,15 +1,75 @@
-"""Email classifier using Groq API"""
+"""Email classifier using Groq API (or another chat-completion backend)"""
 
 import os
-from typing import Dict, Tuple
-from groq import Groq
+import json
+import time
+import hashlib
+import random
+import urllib.error
+import urllib.request
+from typing import Dict, List, Tuple
 from dotenv import load_dotenv
 
+from backends import BackendError, ClassifierBackend, RateLimitedError, create_backend
+from email_record import EmailRecord
+from rate_limiter import CircuitBreaker, RateLimiter
+from usage_tracker import UsageTracker
+
 load_dotenv()
 
 
+# Few-shot examples shown in the prompt, in order (PROMPT_EXAMPLES keeps the first N)
+FEW_SHOT_EXAMPLES = [
+    """Subject: "Just in: Comresource has new Senior Machine Learning Engineer jobs open"
+Sender: lensa.com
+CLASSIFICATION: other
+REASON: Job alert/marketing email, not an application confirmation""",
+    """Subject: "software engineer": Morningstar - Software Engineer and more
+Sender: linkedin.com
+CLASSIFICATION: other
+REASON: LinkedIn job alert, promotional content""",
+    """Subject: Re: [username/repo] Pull Request #7
+Sender: github.com
+CLASSIFICATION: other
+REASON: GitHub notification, not job-related""",
+    """Subject: Thank you for your application - Software Engineer Position
+Sender: hr@techcompany.com
+CLASSIFICATION: application_submitted
+REASON: Direct application confirmation from company HR""",
+    """Subject: Interview Invitation - Next Steps for Software Engineer Role
+Sender: recruiter@company.com
+CLASSIFICATION: followup_required
+REASON: Interview invitation requiring immediate response""",
+    """Subject: Thank you for your interest in our Software Engineer opening at Podium
+Sender: no-reply@us.greenhouse-mail.io
+Body: Unfortunately, the decision has been made to hold on filling the position for the time being
+CLASSIFICATION: other
+REASON: Job rejection email, no action needed""",
+    """Subject: Sai, your application was sent to Theoris
+Sender: jobs-noreply@linkedin.com
+CLASSIFICATION: application_submitted
+REASON: Application confirmation - application was sent/submitted""",
+    """Subject: Your recent job application for Analyst - 244748
+Sender: hdow.fa.sender@workflow.email.us-ashburn-1.ocs.oraclecloud.com
+Body: Thank you for taking the time to apply for a position for Analyst at Newmark. We are now reviewing your application
+CLASSIFICATION: application_submitted
+REASON: Application confirmation - company acknowledging receipt and reviewing application""",
+]
+
+
+class ClassificationError(Exception):
+    """No classification could be obtained - the email should stay unlabeled"""
+
+
 class GroqClassifier:
-    """Simple email classifier using Groq's LLM API"""
+    """Simple email classifier using Groq's LLM API
+    
+    The prompt and parsers live here; the API call goes through a pluggable
+    backend (Groq by default, see backends.py). With CLASSIFIER_DAEMON_URL set
+    it is a thin client of classifier_daemon.py instead, which owns the backend,
+    request budget and cache for every front end; prompt settings then come
+    from the daemon's environment.
+    """
     
     # Label mapping - matches original project
     LABELS = {
@@ -18,73 +78,277 @@ class GroqClassifier:
         'other': '📦 Inbox Clutter'
     }
     
-    def __init__(self, model: str = None):
-        api_key = os.getenv('GROQ_API_KEY')
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not found in .env file")
+    SYSTEM_PROMPT = "You are an expert email classifier for job applications. Respond only with the exact format requested."
+    
+    # Single-letter category codes used by the compact JSON response format
+    CODES = {
+        'A': 'application_submitted',
+        'F': 'followup_required',
+        'O': 'other'
+    }
+    
+    def __init__(self, model: str = None, rate_limiter: RateLimiter = None,
+                 fast_model: str = None, escalation_threshold: float = None,
+                 response_format: str = None, reason_words: int = None,
+                 breaker: CircuitBreaker = None, backend: ClassifierBackend = None,
+                 examples: int = None, body_chars: int = None, daemon_url: str = None,
+                 usage_tracker: UsageTracker = None):
+        # An explicit backend always means classifying in-process
+        if daemon_url is None:
+            daemon_url = '' if backend else os.getenv('CLASSIFIER_DAEMON_URL', '')
+        self.daemon_url = daemon_url.rstrip('/')
+        self.daemon_timeout = float(os.getenv('CLASSIFIER_DAEMON_TIMEOUT_SECONDS', '600'))
+        
+        if self.daemon_url:
+            health = self._daemon_request('GET', '/health')
+            self.backend = None
+            self.backend_name = f"daemon ({health['backend']})"
+            self.model = health['model']
+            # Recorded with results, so it must describe the daemon's prompt, not ours
+            self._daemon_prompt_version = health['prompt_version']
+            fast_model = health['fast_model']
+        else:
+            self.backend = backend or create_backend()
+            self.backend_name = self.backend.name
+            self.model = model or self.backend.default_model
+        
+        # Optional cascade: a small model answers first, the main model only
+        # sees low-confidence or followup_required results
+        self.fast_model = fast_model if fast_model is not None else os.getenv('GROQ_FAST_MODEL')
+        self.escalation_threshold = escalation_threshold if escalation_threshold is not None else float(os.getenv('CASCADE_THRESHOLD', '0.8'))
+        
+        # Prompt size: few-shot examples included and body characters sent
+        self.examples = examples if examples is not None else int(os.getenv('PROMPT_EXAMPLES', len(FEW_SHOT_EXAMPLES)))
+        self.body_chars = body_chars if body_chars is not None else int(os.getenv('PROMPT_BODY_CHARS', '1000'))
+        
+        # 'text' (CLASSIFICATION/CONFIDENCE/REASON lines) or 'json' (compact codes)
+        self.response_format = (response_format or os.getenv('RESPONSE_FORMAT', 'text')).lower()
+        if self.response_format not in ('text', 'json'):
+            raise ValueError(f"Unknown RESPONSE_FORMAT: {self.response_format}")
+        # Word cap for the JSON reason field, 0 drops the reason entirely
+        self.reason_words = reason_words if reason_words is not None else int(os.getenv('REASON_MAX_WORDS', '12'))
         
-        self.client = Groq(api_key=api_key)
-        self.model = model or os.getenv('GROQ_MODEL', 'openai/gpt-oss-20b')
+        # Request budget, shared with other classifiers when passed in (e.g. backfill workers);
+        # the daemon enforces its own
+        self.rate_limiter = None
+        if self.backend:
+            self.rate_limiter = rate_limiter or RateLimiter(self.backend.requests_per_minute)
+        
+        # Stop calling the backend (or an unreachable daemon) while it keeps failing;
+        # failed emails are retried later
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = int(os.getenv('GROQ_MAX_RETRIES', '2'))
+        
+        # Emails per classify_batch call from front ends: one daemon round trip each,
+        # small enough that callers still check deadlines and stop requests between batches
+        self.batch_size = int(os.getenv('CLASSIFY_BATCH_SIZE', '10'))
+        
+        # Per-call token accounting shared with the quota planner
+        self.usage_tracker = usage_tracker
+        self._tier = 'full'
+        self._email_counted = False
+        
+        # Stats for the most recent classify_email call (model, latency, tokens, tiers)
+        self.last_stats = {}
     
-    def classify_email(self, email: Dict) -> Tuple[str, float, str]:
+    def classify_email(self, email: EmailRecord, cheap: bool = False) -> Tuple[str, float, str]:
         """
-        Classify an email with exponential backoff retry
+        Classify an email, escalating through the model cascade if enabled
+        
+        With cheap=True (quota running low) it makes a single call - on the
+        fast model if there is one - with no few-shot examples and no escalation.
         
         Returns:
             (category, confidence, reasoning)
+        
+        Raises:
+            ClassificationError: no model produced an answer; leave the email unlabeled
         """
-        import time
-        import random
+        if self.daemon_url:
+            result = self.classify_batch([email], cheap)[0]
+            if 'error' in result:
+                raise ClassificationError(result['error'])
+            self.last_stats = result['stats']
+            return result['category'], result['confidence'], result['reason']
         
-        # Initial delay to prevent rate limiting
-        time.sleep(3 + random.uniform(0, 2))
+        self.last_stats = {
+            'model': self.model,
+            'latency_ms': 0.0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'prompt_version': self.prompt_version(cheap),
+            'tiers': []
+        }
+        self._tier = 'cheap' if cheap else 'full'
+        self._email_counted = False
+        
+        if cheap:
+            model = self.fast_model or self.model
+            category, confidence, reason = self._complete(model, self._create_prompt(email, examples=0))
+            self._record_tier(model, category, confidence, False)
+            return category, confidence, reason
         
         prompt = self._create_prompt(email)
-        max_retries = 10
-        base_delay = 5
         
-        for attempt in range(max_retries + 1):
+        if self.fast_model:
+            try:
+                category, confidence, reason = self._complete(self.fast_model, prompt)
+                escalate = confidence < self.escalation_threshold or category == 'followup_required'
+                self._record_tier(self.fast_model, category, confidence, escalate)
+                if not escalate:
+                    return category, confidence, reason
+            except ClassificationError as e:
+                # The main model has its own limits, so a failed fast tier escalates
+                print(f"⚠️ Fast tier failed, escalating: {e}")
+        
+        category, confidence, reason = self._complete(self.model, prompt)
+        self._record_tier(self.model, category, confidence, False)
+        return category, confidence, reason
+    
+    def prompt_version(self, cheap: bool = False) -> str:
+        """Short hash of everything that shapes the prompt, stored with each result
+        
+        Editing the prompt, examples, body budget or response format changes it,
+        so sweep.py can find mail classified under an older prompt.
+        """
+        if self.daemon_url:
+            return self._daemon_prompt_version
+        placeholder = EmailRecord(id='', subject='{subject}', sender='{sender}', snippet='{snippet}', body='{body}')
+        prompt = self._create_prompt(placeholder, examples=0 if cheap else None)
+        key = f"{self.SYSTEM_PROMPT}\n{self.body_chars}\n{prompt}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]
+    
+    def classify_batch(self, emails: List[EmailRecord], cheap: bool = False) -> List[Dict]:
+        """Classify several emails, one result dict per email in the same order
+        
+        Each result has category, confidence, reason and stats, or just an
+        error message where classify_email would have raised. Through the
+        daemon this is a single request.
+        """
+        if not self.daemon_url:
+            results = []
+            for email in emails:
+                try:
+                    category, confidence, reason = self.classify_email(email, cheap)
+                    results.append({'category': category, 'confidence': confidence,
+                                    'reason': reason, 'stats': self.last_stats})
+                except ClassificationError as e:
+                    results.append({'error': str(e)})
+            return results
+        
+        if not self.breaker.allow():
+            return [{'error': f"Circuit open - classifier daemon at {self.daemon_url} is unreachable"}] * len(emails)
+        try:
+            response = self._daemon_request('POST', '/classify', {
+                'emails': [e.to_dict() for e in emails],
+                'cheap': cheap
+            })
+        except ValueError as e:
+            self.breaker.record_failure()
+            return [{'error': str(e)}] * len(emails)
+        self.breaker.record_success()
+        return response['results']
+    
+    def _daemon_request(self, method: str, path: str, payload: Dict = None) -> Dict:
+        """JSON request to the classifier daemon, raising ValueError when it can't be reached"""
+        request = urllib.request.Request(
+            self.daemon_url + path,
+            data=json.dumps(payload).encode('utf-8') if payload is not None else None,
+            headers={'Content-Type': 'application/json'},
+            method=method
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.daemon_timeout) as response:
+                return json.load(response)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise ValueError(f"Classifier daemon at {self.daemon_url} failed: {e}") from e
+    
+    def _record_tier(self, model: str, category: str, confidence: float, escalated: bool):
+        self.last_stats['model'] = model
+        self.last_stats['tiers'].append({
+            'model': model,
+            'category': category,
+            'confidence': confidence,
+            'escalated': escalated
+        })
+    
+    def _complete(self, model: str, prompt: str) -> Tuple[str, float, str]:
+        """Run one model with a short in-line retry, accumulating stats
+        
+        Raises ClassificationError instead of guessing when no answer arrives,
+        so callers can defer the email rather than mislabel it.
+        """
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise ClassificationError(f"Circuit open - {self.backend.name} is failing, skipping call")
+            if self.usage_tracker:
+                self.usage_tracker.throttle()
+            self.rate_limiter.acquire()
             try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
+                started = time.perf_counter()
+                json_mode = self.response_format == 'json'
+                completion = self.backend.complete(
+                    model,
                     messages=[
                         {
                             "role": "system",
-                            "content": "You are an expert email classifier for job applications. Respond only with the exact format requested."
+                            "content": self.SYSTEM_PROMPT
                         },
                         {
                             "role": "user",
                             "content": prompt
                         }
                     ],
-                    temperature=0.1,
-                    max_tokens=200
+                    max_tokens=80 if json_mode else 200,
+                    json_mode=json_mode
                 )
-                
-                result = response.choices[0].message.content.strip()
-                
-                return self._parse_response(result)
-                
-            except Exception as e:
-                if "429" in str(e):
-                    # Exponential backoff: 5s, 10s, 20s, 40s, 80s... + jitter
-                    delay = min(base_delay * (2 ** attempt), 300) + random.uniform(0, 5)
-                    print(f"⚠️ Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries + 1})")
+            except BackendError as e:
+                self.breaker.record_failure()
+                if isinstance(e, RateLimitedError) and attempt < self.max_retries:
+                    # Short exponential backoff: 5s, 10s, 20s... + jitter, longer waits go to the retry queue
+                    delay = min(5 * (2 ** attempt), 30) + random.uniform(0, 2)
+                    print(f"⚠️ Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries + 1})")
                     time.sleep(delay)
                     continue
-                else:
-                    print(f"⚠️ Classification error: {e}")
-                    return 'other', 0.5, 'Classification failed'
-        
-        print("⚠️ Max retries exceeded, but continuing...")
-        return 'other', 0.5, 'Rate limited - will retry later'
+                raise ClassificationError(f"{model}: {e}") from e
+            
+            self.breaker.record_success()
+            result = completion.text
+            
+            self.last_stats['latency_ms'] += (time.perf_counter() - started) * 1000
+            self.last_stats['prompt_tokens'] += completion.prompt_tokens
+            self.last_stats['completion_tokens'] += completion.completion_tokens
+            if self.usage_tracker:
+                self.usage_tracker.record(model, self._tier, completion.prompt_tokens,
+                                          completion.completion_tokens, new_email=not self._email_counted)
+                self._email_counted = True
+            
+            if self.response_format == 'json':
+                try:
+                    return self._parse_json_response(result)
+                except ValueError as e:
+                    print(f"⚠️ Invalid JSON response ({e}), falling back to text parser")
+            try:
+                return self._parse_response(result)
+            except ValueError as e:
+                # Escalates from the fast tier; from the last tier the email is deferred, not labeled
+                raise ClassificationError(f"{model}: {e}") from e
     
-    def _create_prompt(self, email: Dict) -> str:
+    def _create_prompt(self, email: EmailRecord, examples: int = None) -> str:
         """Create classification prompt - exact prompt from working project"""
-        subject = email.get('subject', '')
-        sender = email.get('sender', '')
-        snippet = email.get('snippet', '')
-        body = email.get('body', '')[:1000]  # Limit body length
+        subject = email.subject
+        sender = email.sender
+        snippet = email.snippet
+        body = email.body[:self.body_chars]  # Limit body length
+        # Thread mode: earlier messages give the latest one its context
+        history = f"- Earlier in this thread:\n{email.history}\n" if email.history else ''
+        
+        example_count = self.examples if examples is None else examples
+        examples = ''
+        if example_count:
+            examples = '**Examples:**\n\n' + ''.join(
+                f'Example {i}:\n{example}\n\n' for i, example in enumerate(FEW_SHOT_EXAMPLES[:example_count], 1)
+            )
         
         return f"""You are an expert email classifier specializing in job application emails. Your task is to classify emails into exactly one of these three categories:
 
@@ -94,64 +358,12 @@ class GroqClassifier:
 
 **IMPORTANT**: Job alert emails, marketing emails from job sites, and promotional content should ALWAYS be classified as "other" even if they mention jobs.
 
-**Examples:**
-
-Example 1:
-Subject: "Just in: Comresource has new Senior Machine Learning Engineer jobs open"
-Sender: lensa.com
-CLASSIFICATION: other
-REASON: Job alert/marketing email, not an application confirmation
-
-Example 2:
-Subject: "software engineer": Morningstar - Software Engineer and more
-Sender: linkedin.com
-CLASSIFICATION: other
-REASON: LinkedIn job alert, promotional content
-
-Example 3:
-Subject: Re: [username/repo] Pull Request #7
-Sender: github.com
-CLASSIFICATION: other
-REASON: GitHub notification, not job-related
-
-Example 4:
-Subject: Thank you for your application - Software Engineer Position
-Sender: hr@techcompany.com
-CLASSIFICATION: application_submitted
-REASON: Direct application confirmation from company HR
-
-Example 5:
-Subject: Interview Invitation - Next Steps for Software Engineer Role
-Sender: recruiter@company.com
-CLASSIFICATION: followup_required
-REASON: Interview invitation requiring immediate response
-
-Example 6:
-Subject: Thank you for your interest in our Software Engineer opening at Podium
-Sender: no-reply@us.greenhouse-mail.io
-Body: Unfortunately, the decision has been made to hold on filling the position for the time being
-CLASSIFICATION: other
-REASON: Job rejection email, no action needed
-
-Example 7:
-Subject: Sai, your application was sent to Theoris
-Sender: jobs-noreply@linkedin.com
-CLASSIFICATION: application_submitted
-REASON: Application confirmation - application was sent/submitted
-
-Example 8:
-Subject: Your recent job application for Analyst - 244748
-Sender: hdow.fa.sender@workflow.email.us-ashburn-1.ocs.oraclecloud.com
-Body: Thank you for taking the time to apply for a position for Analyst at Newmark. We are now reviewing your application
-CLASSIFICATION: application_submitted
-REASON: Application confirmation - company acknowledging receipt and reviewing application
-
-**Now classify this email:**
+{examples}**Now classify this email:**
 - Subject: {subject}
 - Sender: {sender}
 - Preview: {snippet}
 - Body: {body}
-
+{history}
 **Key Classification Rules:**
 - Job alerts from job sites (LinkedIn, Indeed, Lensa, etc.) = other
 - Marketing emails with job listings = other
@@ -163,15 +375,53 @@ REASON: Application confirmation - company acknowledging receipt and reviewing a
 - Only classify as "followup_required" if it requires immediate action (interview, documents, offer)
 - "is for" in subject typically means application_submitted (e.g., "Your application is for Software Engineer")
 
-Respond exactly as:
+{self._response_instructions()}
+"""
+    
+    def _response_instructions(self) -> str:
+        """Tell the model which output format to use"""
+        if self.response_format == 'text':
+            return """Respond exactly as:
 CLASSIFICATION: [category]
 CONFIDENCE: [0.0-1.0]
-REASON: [brief explanation]
-"""
+REASON: [brief explanation]"""
+        
+        codes = ', '.join(f'{code}={category}' for code, category in self.CODES.items())
+        if self.reason_words:
+            return (f'Respond with JSON only: {{"c": "<code>", "p": <0.0-1.0>, "r": "<reason, max {self.reason_words} words>"}}\n'
+                    f'Codes: {codes}')
+        return f'Respond with JSON only: {{"c": "<code>", "p": <0.0-1.0>}}\nCodes: {codes}'
+    
+    def _parse_json_response(self, response: str) -> Tuple[str, float, str]:
+        """Strictly parse the compact JSON format, raising ValueError on anything unexpected"""
+        try:
+            data = json.loads(response)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"not JSON: {e}")
+        if not isinstance(data, dict):
+            raise ValueError("not a JSON object")
+        
+        code = str(data.get('c', '')).strip()
+        category = self.CODES.get(code.upper()) or (code.lower() if code.lower() in self.LABELS else None)
+        if not category:
+            raise ValueError(f"unknown category code {code!r}")
+        
+        try:
+            confidence = float(data['p'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("missing or non-numeric confidence")
+        if not 0.0 <= confidence <= 1.0:
+            raise ValueError(f"confidence {confidence} out of range")
+        
+        reason = str(data.get('r') or 'No reason given')
+        if self.reason_words:
+            reason = ' '.join(reason.split()[:self.reason_words])
+        
+        return category, confidence, reason
     
     def _parse_response(self, response: str) -> Tuple[str, float, str]:
-        """Parse LLM response"""
-        category = 'other'
+        """Parse LLM response, raising ValueError when it names no valid category"""
+        category = None
         confidence = 0.5
         reason = 'Parsed from AI response'
         
@@ -185,17 +435,15 @@ REASON: [brief explanation]
                     category = cat
             elif line.startswith('CONFIDENCE:'):
                 try:
-                    confidence = float(line.split(':', 1)[1].strip())
-                except:
+                    confidence = min(max(float(line.split(':', 1)[1].strip()), 0.0), 1.0)
+                except ValueError:
                     confidence = 0.7
             elif line.startswith('REASON:'):
                 reason = line.split(':', 1)[1].strip()
         
-        # Validate classification
-        valid_classifications = ['application_submitted', 'followup_required', 'other']
-        if category not in valid_classifications:
-            category = 'other'
-            confidence = 0.3
+        # No valid category - never fall back to a guessed 'other' label
+        if category is None:
+            raise ValueError(f"could not parse classification from response: {response[:100]!r}")
         
         return category, confidence, reason
     
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Local classification daemon shared by the web app, background service and backfill
+
+One warm process owns the backend connection, rate limiter, circuit breaker
+and a result cache. Front ends become thin clients by setting
+CLASSIFIER_DAEMON_URL (see GroqClassifier), so they all draw from one
+request budget instead of each throttling on its own.
+
+    POST /classify  {"emails": [EmailRecord dicts]} -> {"results": [...]}
+    GET  /health    backend, model, breaker and cache state
+"""
+
+import os
+import json
+import hashlib
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from backends import create_backend
+from classifier import ClassificationError, GroqClassifier
+from email_record import EmailRecord
+from rate_limiter import CircuitBreaker, RateLimiter
+from usage_tracker import UsageTracker
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('classifier.log'),
+        logging.StreamHandler()
+    ]
+)
+
+
+class ResultCache:
+    """LRU of classification results keyed by the exact prompt sent"""
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('DAEMON_CACHE_SIZE', '10000'))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return result
+
+    def put(self, key: str, result: Dict):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ClassifierService:
+    """Shared backend, request budget, breaker and cache behind the HTTP handler"""
+
+    def __init__(self, backend_name: str = None):
+        self.backend = create_backend(backend_name)
+        self.rate_limiter = RateLimiter(self.backend.requests_per_minute)
+        self.breaker = CircuitBreaker()
+        self.cache = ResultCache()
+        self.usage_tracker = UsageTracker()
+        self.model = self.backend.default_model
+        # No point queueing more in-flight emails than the backend accepts at once
+        self.pool = ThreadPoolExecutor(max_workers=self.backend.max_concurrency)
+        # last_stats is per classifier, so each pool thread gets its own
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _classifier(self) -> GroqClassifier:
+        if not hasattr(self._local, 'classifier'):
+            self._local.classifier = GroqClassifier(
+                rate_limiter=self.rate_limiter, breaker=self.breaker, backend=self.backend,
+                usage_tracker=self.usage_tracker
+            )
+        return self._local.classifier
+
+    def classify(self, email: EmailRecord, cheap: bool = False) -> Dict:
+        classifier = self._classifier()
+        # Identical prompts get identical answers, whichever front end asks
+        prompt = classifier._create_prompt(email, examples=0 if cheap else None)
+        key = hashlib.sha256(f"{cheap}:{prompt}".encode('utf-8')).hexdigest()
+        cached = self.cache.get(key)
+        if cached is not None:
+            stats = dict(cached['stats'], latency_ms=0.0, prompt_tokens=0, completion_tokens=0, cached=True)
+            return dict(cached, stats=stats)
+
+        try:
+            category, confidence, reason = classifier.classify_email(email, cheap)
+        except ClassificationError as e:
+            return {'error': str(e)}
+        result = {'category': category, 'confidence': confidence, 'reason': reason,
+                  'stats': classifier.last_stats}
+        self.cache.put(key, result)
+        return result
+
+    def classify_batch(self, emails, cheap: bool = False):
+        with self._lock:
+            self.requests += 1
+        return list(self.pool.map(lambda email: self.classify(email, cheap), emails))
+
+    def health(self) -> Dict:
+        return {
+            'status': 'ok',
+            'backend': self.backend.name,
+            'model': self.model,
+            'fast_model': self._classifier().fast_model or '',
+            'prompt_version': self._classifier().prompt_version(),
+            'breaker_open': self.breaker.is_open,
+            'cache_entries': len(self.cache),
+            'cache_hits': self.cache.hits,
+            'requests': self.requests,
+            'usage': self.usage_tracker.summary(),
+        }
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    """JSON over HTTP; the service is attached to the server"""
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send(404, {'error': 'not found'})
+            return
+        self._send(200, self.server.service.health())
+
+    def do_POST(self):
+        if self.path != '/classify':
+            self._send(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length))
+            emails = [EmailRecord.from_dict(e) for e in payload['emails']]
+            cheap = bool(payload.get('cheap', False))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {'error': f'bad request: {e}'})
+            return
+
+        results = self.server.service.classify_batch(emails, cheap)
+        logging.info(f"📨 Classified batch of {len(emails)} ({sum('error' in r for r in results)} errors)")
+        self._send(200, {'results': results})
+
+    def _send(self, status: int, body: Dict):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Batches are logged above; skip the per-request access log
+        pass
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Shared local classifier daemon')
+    parser.add_argument('--host', default=os.getenv('CLASSIFIER_DAEMON_HOST', '127.0.0.1'),
+                        help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=int(os.getenv('CLASSIFIER_DAEMON_PORT', '8765')),
+                        help='Port to listen on (default: 8765)')
+    parser.add_argument('--backend', help='Backend to use (default: CLASSIFIER_BACKEND)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print("🚀 Job Email Classifier - Classifier Daemon")
+    print("=" * 50)
+    try:
+        service = ClassifierService(args.backend)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+
+    server = ThreadingHTTPServer((args.host, args.port), DaemonHandler)
+    server.service = service
+    print(f"🤖 Backend {service.backend.name} (model: {service.model}), "
+          f"{service.backend.requests_per_minute:g} requests/min, {service.backend.max_concurrency} concurrent")
+    print(f"📡 Listening on http://{args.host}:{args.port} - set CLASSIFIER_DAEMON_URL to use it")
+    print("Press Ctrl+C to stop\n")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping classifier daemon...")
+    finally:
+        server.server_close()
+        service.pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
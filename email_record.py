@@ -0,0 +1,52 @@
+"""Compact, immutable email record shared by the client, classifier and front ends"""
+
+import os
+import sys
+from dataclasses import asdict, dataclass, fields
+from typing import Dict
+
+
+def body_char_budget() -> int:
+    """Body characters kept per email (the prompt only ever uses the start)"""
+    return int(os.getenv('BODY_CHAR_BUDGET', '1000'))
+
+
+@dataclass(frozen=True, slots=True)
+class EmailRecord:
+    """One email as the classifier needs it, with the body already truncated"""
+    id: str
+    subject: str = 'No Subject'
+    sender: str = 'Unknown'
+    date: str = ''
+    snippet: str = ''
+    body: str = ''
+    thread_id: str = ''
+    # Thread mode: one line per earlier message in the conversation
+    history: str = ''
+
+    @classmethod
+    def create(cls, id: str, subject: str = 'No Subject', sender: str = 'Unknown',
+               date: str = '', snippet: str = '', body: str = '', thread_id: str = '',
+               history: str = '', body_chars: int = None) -> 'EmailRecord':
+        """Build a record, cutting the body to the budget before it is stored"""
+        budget = body_char_budget() if body_chars is None else body_chars
+        return cls(
+            id=id,
+            subject=subject,
+            # The same few senders repeat across a mailbox, so share one string each
+            sender=sys.intern(sender),
+            date=date,
+            snippet=snippet,
+            body=body[:budget],
+            thread_id=thread_id,
+            history=history
+        )
+
+    def to_dict(self) -> Dict:
+        """Plain dict for JSON, e.g. requests to the classifier daemon"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'EmailRecord':
+        """Inverse of to_dict; unknown keys are ignored and the body is kept as sent"""
+        return cls(**{f.name: data[f.name] for f in fields(cls) if f.name in data})
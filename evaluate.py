@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Evaluate prompt, body budget and model choices on a labeled local corpus"""
+
+import os
+import sys
+import json
+import email
+import argparse
+import itertools
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from backends import create_backend
+from classifier import FEW_SHOT_EXAMPLES, ClassificationError, GroqClassifier
+from email_record import EmailRecord
+from gmail_client import email_from_mime
+from rate_limiter import CircuitBreaker, RateLimiter
+
+CATEGORIES = list(GroqClassifier.LABELS)
+
+
+def load_corpus(path: str, limit: int = None) -> List[Tuple[EmailRecord, str]]:
+    """(email, true category) pairs from a JSONL file or a directory of .eml files
+
+    JSONL lines need subject/sender/snippet/body and a label. For .eml
+    directories the label is the name of the folder holding each file,
+    e.g. corpus/followup_required/interview.eml.
+    """
+    samples = []
+    # Keep whole bodies; each configuration applies its own prompt budget
+    body_chars = sys.maxsize
+
+    if os.path.isdir(path):
+        for root, _, files in sorted(os.walk(path)):
+            label = os.path.basename(root)
+            for name in sorted(files):
+                if not name.endswith('.eml') or label not in CATEGORIES:
+                    continue
+                with open(os.path.join(root, name), 'rb') as f:
+                    message = email.message_from_binary_file(f)
+                samples.append((email_from_mime(message, name, body_chars), label))
+    else:
+        with open(path) as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if row.get('label') not in CATEGORIES:
+                    raise ValueError(f"{path}:{line_number}: label must be one of {CATEGORIES}")
+                record = EmailRecord.create(
+                    id=str(row.get('id', line_number)),
+                    subject=row.get('subject', 'No Subject'),
+                    sender=row.get('sender', 'Unknown'),
+                    date=row.get('date', ''),
+                    snippet=row.get('snippet', ''),
+                    body=row.get('body', ''),
+                    body_chars=body_chars
+                )
+                samples.append((record, row['label']))
+
+    return samples[:limit] if limit else samples
+
+
+def evaluate(classifier: GroqClassifier, samples: List[Tuple[EmailRecord, str]]) -> Dict:
+    """Run every sample through one classifier configuration"""
+    confusion = defaultdict(lambda: defaultdict(int))
+    totals = {'prompt_tokens': 0, 'completion_tokens': 0, 'latency_ms': 0.0}
+    answered = 0
+
+    for record, truth in samples:
+        try:
+            predicted, _, _ = classifier.classify_email(record)
+            answered += 1
+            for key in totals:
+                totals[key] += classifier.last_stats[key]
+        except ClassificationError:
+            predicted = 'error'
+        confusion[truth][predicted] += 1
+
+    correct = sum(confusion[c][c] for c in CATEGORIES)
+    followups = sum(confusion['followup_required'].values())
+    predicted_followups = sum(confusion[t]['followup_required'] for t in CATEGORIES)
+
+    return {
+        'emails': len(samples),
+        'errors': len(samples) - answered,
+        'accuracy': correct / len(samples) if samples else 0.0,
+        'followup_recall': confusion['followup_required']['followup_required'] / followups if followups else 0.0,
+        'followup_precision': (confusion['followup_required']['followup_required'] / predicted_followups
+                               if predicted_followups else 0.0),
+        'prompt_tokens': totals['prompt_tokens'] / answered if answered else 0.0,
+        'completion_tokens': totals['completion_tokens'] / answered if answered else 0.0,
+        'latency_ms': totals['latency_ms'] / answered if answered else 0.0,
+        'confusion': {t: dict(row) for t, row in confusion.items()},
+    }
+
+
+def print_confusion(confusion: Dict):
+    columns = CATEGORIES + ['error']
+    short = {'application_submitted': 'applied', 'followup_required': 'followup', 'other': 'other', 'error': 'error'}
+    print(f"    {'true / predicted':<18}" + ''.join(f"{short[c]:>10}" for c in columns))
+    for truth in CATEGORIES:
+        row = confusion.get(truth, {})
+        print(f"    {short[truth]:<18}" + ''.join(f"{row.get(c, 0):>10}" for c in columns))
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',')]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compare classifier configurations on a labeled corpus')
+    parser.add_argument('corpus', help='JSONL file or directory of <category>/*.eml files')
+    parser.add_argument('--models', help='Comma-separated models (default: the backend default)')
+    parser.add_argument('--examples', type=_int_list, default=[len(FEW_SHOT_EXAMPLES)],
+                        help=f'Comma-separated few-shot example counts (default: {len(FEW_SHOT_EXAMPLES)})')
+    parser.add_argument('--body-chars', type=_int_list, default=[1000],
+                        help='Comma-separated prompt body budgets (default: 1000)')
+    parser.add_argument('--formats', default='text', help='Comma-separated response formats: text,json')
+    parser.add_argument('--backend', help='Backend to use (default: CLASSIFIER_BACKEND)')
+    parser.add_argument('--limit', type=int, help='Only use the first N emails')
+    parser.add_argument('--min-recall', type=float,
+                        help='Followup recall to keep when picking the cheapest config (default: best seen)')
+    parser.add_argument('--json-out', help='Also write the full report as JSON')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    samples = load_corpus(args.corpus, args.limit)
+    if not samples:
+        print(f"❌ No labeled emails found in {args.corpus}")
+        return
+
+    try:
+        backend = create_backend(args.backend)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+
+    models = args.models.split(',') if args.models else [backend.default_model]
+    formats = args.formats.split(',')
+    # One budget across all configurations so back-to-back runs respect the backend limits
+    rate_limiter = RateLimiter(backend.requests_per_minute)
+    breaker = CircuitBreaker()
+
+    print(f"📊 {len(samples)} emails, backend {backend.name}")
+    reports = []
+    for model, examples, body_chars, response_format in itertools.product(
+            models, args.examples, args.body_chars, formats):
+        config = {'model': model, 'examples': examples, 'body_chars': body_chars, 'format': response_format}
+        print(f"\n🔍 {config}")
+
+        classifier = GroqClassifier(
+            model=model, fast_model='', backend=backend, rate_limiter=rate_limiter, breaker=breaker,
+            examples=examples, body_chars=body_chars, response_format=response_format
+        )
+        report = evaluate(classifier, samples)
+        report['config'] = config
+        reports.append(report)
+
+        print(f"    accuracy {report['accuracy']:.1%}  followup recall {report['followup_recall']:.1%}  "
+              f"precision {report['followup_precision']:.1%}  errors {report['errors']}")
+        print(f"    per email: {report['prompt_tokens']:.0f} prompt + {report['completion_tokens']:.0f} output tokens, "
+              f"{report['latency_ms']:.0f} ms")
+        print_confusion(report['confusion'])
+
+    # Cheapest configuration (by total tokens per email) that keeps followup recall
+    min_recall = args.min_recall if args.min_recall is not None else max(r['followup_recall'] for r in reports)
+    keeping = [r for r in reports if r['followup_recall'] >= min_recall]
+    if keeping:
+        best = min(keeping, key=lambda r: (r['prompt_tokens'] + r['completion_tokens'], -r['accuracy']))
+        print(f"\n💡 Cheapest config with followup recall ≥ {min_recall:.1%}: {best['config']} "
+              f"({best['prompt_tokens'] + best['completion_tokens']:.0f} tokens/email, accuracy {best['accuracy']:.1%})")
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"🗄️  Report written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,11 @@
 import os
 import json
 import base64
+import dataclasses
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from email.header import decode_header, make_header
+from email.message import Message
+from typing import List, Dict, Optional, Tuple
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -13,15 +16,28 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from bs4 import BeautifulSoup
 
+from email_record import EmailRecord
+from message_store import MessageStore
+from query_builder import QueryBuilder
+
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 
+# Excludes mail that already carries one of our labels
+UNLABELED_QUERY = '-label:"🚀 Seeds Planted" -label:"⚡ Action Required" -label:"📦 Inbox Clutter"'
+
 
 class GmailClient:
     """Simple Gmail API client"""
     
-    def __init__(self, token_file: str = 'token.json'):
+    def __init__(self, token_file: str = 'token.json', query_builder: QueryBuilder = None,
+                 body_chars: int = None, message_store: MessageStore = None):
         self.service = None
         self.token_file = token_file
+        self.query_builder = query_builder or QueryBuilder()
+        # Body characters kept per email, None uses BODY_CHAR_BUDGET
+        self.body_chars = body_chars
+        # Messages already downloaded are read locally instead of from the API
+        self.message_store = message_store if message_store is not None else MessageStore()
     
     def authenticate(self) -> bool:
         """Authenticate with Gmail API"""
@@ -51,13 +67,20 @@ class GmailClient:
         self.service = build('gmail', 'v1', credentials=creds)
         return True
     
-    def get_unlabeled_emails(self, days: int = 7, max_results: int = 50) -> List[Dict]:
+    def unlabeled_query(self, days: int = 7) -> str:
+        """Search query for recent emails without our labels"""
+        after_date = (datetime.now() - timedelta(days=days)).strftime('%Y/%m/%d')
+        return self.query_builder.build(f'after:{after_date} {UNLABELED_QUERY}')
+    
+    def clutter_query(self, days: int = 7) -> Optional[str]:
+        """Search query for recent unlabeled emails the prefilter marks as clutter"""
+        after_date = (datetime.now() - timedelta(days=days)).strftime('%Y/%m/%d')
+        return self.query_builder.clutter_query(f'after:{after_date} {UNLABELED_QUERY}')
+    
+    def get_unlabeled_emails(self, days: int = 7, max_results: int = 50) -> List[EmailRecord]:
         """Fetch emails that haven't been labeled by our system"""
         try:
-            after_date = (datetime.now() - timedelta(days=days)).strftime('%Y/%m/%d')
-            
-            # Query for emails without our labels
-            query = f'after:{after_date} -label:"🚀 Seeds Planted" -label:"⚡ Action Required" -label:"📦 Inbox Clutter"'
+            query = self.unlabeled_query(days)
             
             results = self.service.users().messages().list(
                 userId='me',
@@ -79,8 +102,107 @@ class GmailClient:
             print(f'Gmail API error: {error}')
             return []
     
-    def _get_email_details(self, message_id: str) -> Optional[Dict]:
+    def list_messages(self, query: str, max_results: int = 100,
+                      page_token: str = None) -> Tuple[List[str], Optional[str]]:
+        """List message IDs for a search query, returns (ids, next_page_token)"""
+        request = {'userId': 'me', 'q': query, 'maxResults': max_results}
+        if page_token:
+            request['pageToken'] = page_token
+        
+        results = self.service.users().messages().list(**request).execute()
+        ids = [m['id'] for m in results.get('messages', [])]
+        return ids, results.get('nextPageToken')
+    
+    def get_emails(self, message_ids: List[str]) -> List[EmailRecord]:
+        """Fetch details for the given message IDs, skipping any that fail"""
+        emails = []
+        for message_id in message_ids:
+            email_data = self._get_email_details(message_id)
+            if email_data:
+                emails.append(email_data)
+        return emails
+    
+    def get_email_summaries(self, message_ids: List[str]) -> List[EmailRecord]:
+        """Fetch headers and snippet only (empty body) - much cheaper than full messages"""
+        summaries = []
+        for message_id in message_ids:
+            cached = self.message_store.get(message_id, self.body_chars)
+            if cached:
+                summaries.append(dataclasses.replace(cached, body=''))
+                continue
+            
+            try:
+                message = self.service.users().messages().get(
+                    userId='me',
+                    id=message_id,
+                    format='metadata',
+                    metadataHeaders=['Subject', 'From', 'Date']
+                ).execute()
+            except HttpError:
+                continue
+            
+            summaries.append(self._record_from_message(message, with_body=False))
+        return summaries
+    
+    def list_threads(self, query: str, max_results: int = 100,
+                     page_token: str = None) -> Tuple[List[str], Optional[str]]:
+        """List thread IDs for a search query, returns (ids, next_page_token)
+        
+        A thread matches while any of its messages does, so a labeled thread
+        shows up again as soon as a new, unlabeled reply arrives.
+        """
+        request = {'userId': 'me', 'q': query, 'maxResults': max_results}
+        if page_token:
+            request['pageToken'] = page_token
+        
+        results = self.service.users().threads().list(**request).execute()
+        ids = [t['id'] for t in results.get('threads', [])]
+        return ids, results.get('nextPageToken')
+    
+    def get_thread_summaries(self, thread_ids: List[str]) -> List[EmailRecord]:
+        """Latest message of each thread (headers only) with earlier messages in its history"""
+        summaries = []
+        for thread_id in thread_ids:
+            try:
+                thread = self.service.users().threads().get(
+                    userId='me',
+                    id=thread_id,
+                    format='metadata',
+                    metadataHeaders=['Subject', 'From', 'Date']
+                ).execute()
+            except HttpError:
+                continue
+            
+            # Gmail lists a thread's messages oldest first
+            messages = thread.get('messages', [])
+            if not messages:
+                continue
+            earlier = [self._record_from_message(m, with_body=False) for m in messages[:-1]]
+            summaries.append(self._record_from_message(
+                messages[-1], with_body=False, history=thread_history(earlier)
+            ))
+        return summaries
+    
+    def get_unlabeled_threads(self, days: int = 7, max_results: int = 50) -> List[EmailRecord]:
+        """One record per unlabeled thread: its latest message in full plus a summary of the rest"""
+        try:
+            thread_ids, _ = self.list_threads(self.unlabeled_query(days), max_results=max_results)
+            emails = []
+            for summary in self.get_thread_summaries(thread_ids):
+                fetched = self.get_emails([summary.id])
+                if fetched:
+                    emails.append(dataclasses.replace(fetched[0], history=summary.history))
+            return emails
+        except HttpError as error:
+            print(f'Gmail API error: {error}')
+            return []
+    
+    def _get_email_details(self, message_id: str) -> Optional[EmailRecord]:
         """Get email details"""
+        cached = self.message_store.get(message_id, self.body_chars)
+        if cached:
+            return cached
+        
         try:
             message = self.service.users().messages().get(
                 userId='me',
@@ -88,26 +210,30 @@ class GmailClient:
                 format='full'
             ).execute()
             
-            headers = message['payload'].get('headers', [])
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-            sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown')
-            date = next((h['value'] for h in headers if h['name'] == 'Date'), '')
-            
-            body = self._extract_body(message['payload'])
-            
-            return {
-                'id': message_id,
-                'subject': subject,
-                'sender': sender,
-                'date': date,
-                'body': body,
-                'snippet': message.get('snippet', '')
-            }
+            email = self._record_from_message(message)
+            self.message_store.put(email, self.body_chars)
+            return email
             
         except HttpError:
             return None
     
-    def _extract_body(self, payload: Dict) -> str:
+    def _record_from_message(self, message: Dict, with_body: bool = True, history: str = '') -> EmailRecord:
+        """EmailRecord from a Gmail API message resource"""
+        headers = message['payload'].get('headers', [])
+        return EmailRecord.create(
+            id=message['id'],
+            subject=next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject'),
+            sender=next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown'),
+            date=next((h['value'] for h in headers if h['name'] == 'Date'), ''),
+            snippet=message.get('snippet', ''),
+            body=self._extract_body(message['payload']) if with_body else '',
+            thread_id=message.get('threadId', ''),
+            history=history,
+            body_chars=self.body_chars
+        )
+    
+    @staticmethod
+    def _extract_body(payload: Dict) -> str:
         """Extract email body text"""
         body = ""
         
@@ -172,3 +298,112 @@ class GmailClient:
             return True
         except HttpError:
             return False
+    
+    def label_thread(self, thread_id: str, label_id: str, remove_label_ids: List[str] = None) -> bool:
+        """Apply a label to every message in a thread, dropping remove_label_ids in the same call"""
+        try:
+            self.service.users().threads().modify(
+                userId='me',
+                id=thread_id,
+                body={'addLabelIds': [label_id], 'removeLabelIds': remove_label_ids or []}
+            ).execute()
+            return True
+        except HttpError:
+            return False
+    
+    def batch_modify(self, message_ids: List[str], add_label_ids: List[str] = None,
+                     remove_label_ids: List[str] = None) -> int:
+        """Add/remove labels on many emails, 1000 per API call; returns emails modified"""
+        modified = 0
+        for start in range(0, len(message_ids), 1000):
+            chunk = message_ids[start:start + 1000]
+            try:
+                self.service.users().messages().batchModify(
+                    userId='me',
+                    body={
+                        'ids': chunk,
+                        'addLabelIds': add_label_ids or [],
+                        'removeLabelIds': remove_label_ids or []
+                    }
+                ).execute()
+                modified += len(chunk)
+            except HttpError as error:
+                print(f'Batch modify error: {error}')
+        return modified
+    
+    def label_all_matching(self, query: str, label_id: str, limit: int = 5000) -> int:
+        """Apply a label to every email matching query without downloading them"""
+        message_ids = []
+        page_token = None
+        while len(message_ids) < limit:
+            ids, page_token = self.list_messages(query, max_results=500, page_token=page_token)
+            message_ids += ids
+            if not page_token:
+                break
+        return self.batch_modify(message_ids[:limit], add_label_ids=[label_id])
+
+
+def thread_history(earlier: List[EmailRecord], max_messages: int = None) -> str:
+    """Compact summary of a thread's earlier messages, most recent last
+    
+    Only the last THREAD_HISTORY_MESSAGES (default 4) are kept, as one
+    sender + snippet line each, so long threads don't inflate the prompt.
+    """
+    if max_messages is None:
+        max_messages = int(os.getenv('THREAD_HISTORY_MESSAGES', '4'))
+    if max_messages <= 0:
+        return ''
+    lines = [f"  - {e.sender} ({e.date}): {' '.join(e.snippet.split())[:150]}" for e in earlier[-max_messages:]]
+    skipped = len(earlier) - len(lines)
+    if skipped > 0:
+        lines.insert(0, f"  - ({skipped} older messages)")
+    return '\n'.join(lines)
+
+
+def email_from_mime(message: Message, message_id: str, body_chars: int = None) -> EmailRecord:
+    """Build an EmailRecord from a stdlib MIME message (.eml, mbox, Maildir)
+    
+    The message is converted to the Gmail API payload shape first so the body
+    goes through exactly the same extraction as mail fetched from Gmail.
+    """
+    body = GmailClient._extract_body(_mime_to_payload(message))
+    return EmailRecord.create(
+        id=message_id,
+        subject=_mime_header(message, 'Subject', 'No Subject'),
+        sender=_mime_header(message, 'From', 'Unknown'),
+        date=_mime_header(message, 'Date', ''),
+        # Gmail's snippet is roughly the first 200 characters of body text
+        snippet=' '.join(body.split())[:200],
+        body=body,
+        body_chars=body_chars
+    )
+
+
+def _mime_header(message: Message, name: str, default: str) -> str:
+    value = message.get(name)
+    if value is None:
+        return default
+    try:
+        return str(make_header(decode_header(str(value))))
+    except (UnicodeDecodeError, LookupError, ValueError):
+        return str(value)
+
+
+def _mime_to_payload(message: Message) -> Dict:
+    """Convert a MIME message into Gmail's payload dict (mimeType, body.data, parts)"""
+    payload = {'mimeType': message.get_content_type(), 'body': {}}
+    
+    if message.is_multipart():
+        payload['parts'] = [_mime_to_payload(part) for part in message.get_payload()]
+        return payload
+    
+    data = message.get_payload(decode=True)
+    if data:
+        # Gmail hands us UTF-8, so re-encode from the declared charset
+        charset = message.get_content_charset() or 'utf-8'
+        try:
+            text = data.decode(charset, errors='ignore')
+        except LookupError:
+            text = data.decode('utf-8', errors='ignore')
+        payload['body']['data'] = base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+    return payload
@@ -0,0 +1,113 @@
+"""Message leases so concurrent workers never classify the same email twice"""
+
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from typing import List
+
+from email_record import EmailRecord
+
+
+class LeaseManager:
+    """Time-limited claims on message IDs, stored in a local SQLite database
+
+    Every worker on the host (background service, Streamlit sessions, backfill)
+    claims a batch before classifying it. Claims are made inside a
+    BEGIN IMMEDIATE transaction, so two workers can never both win the same
+    message, and a crashed worker's leases simply expire after the TTL.
+
+    Keys are message or thread IDs. claim_emails() takes both for each email,
+    so a thread-mode worker and a message-mode worker (backfill, the app)
+    can never both be on the same conversation.
+    """
+
+    def __init__(self, path: str = None, ttl_seconds: float = None, owner: str = None):
+        self.path = path or os.getenv('LEASE_DB', 'leases.db')
+        self.ttl_seconds = ttl_seconds or float(os.getenv('LEASE_TTL_SECONDS', '900'))
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+
+        # Autocommit mode; transactions are opened explicitly below
+        self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS leases (
+                message_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+
+    def claim(self, message_ids: List[str]) -> List[str]:
+        """Lease as many of message_ids as possible, returns the ones now held by us"""
+        if not message_ids:
+            return []
+
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                # Take free or expired rows; keep (and extend) our own
+                self._db.executemany('''
+                    INSERT INTO leases (message_id, owner, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT(message_id) DO UPDATE SET
+                        owner = excluded.owner,
+                        expires_at = excluded.expires_at
+                    WHERE leases.expires_at <= ? OR leases.owner = excluded.owner
+                ''', [(m, self.owner, now + self.ttl_seconds, now) for m in message_ids])
+                held = self._held(message_ids)
+                self._db.execute('COMMIT')
+            except sqlite3.Error:
+                self._db.execute('ROLLBACK')
+                raise
+
+        # Keep the caller's order
+        return [m for m in message_ids if m in held]
+
+    def claim_emails(self, emails: List[EmailRecord]) -> List[EmailRecord]:
+        """Lease each email by its message ID and its thread ID, returns the emails fully held
+
+        Partial claims are given back so whoever holds the rest can finish it.
+        """
+        held = set(self.claim(lease_keys(emails)))
+        won = [e for e in emails if all(k in held for k in lease_keys([e]))]
+        kept = set(lease_keys(won))
+        self.release([k for k in held if k not in kept])
+        return won
+
+    def release(self, message_ids: List[str]):
+        """Give up our leases, e.g. once emails are labeled or deferred"""
+        if not message_ids:
+            return
+        with self._lock:
+            self._db.executemany(
+                'DELETE FROM leases WHERE message_id = ? AND owner = ?',
+                [(m, self.owner) for m in message_ids]
+            )
+
+    def purge_expired(self) -> int:
+        """Drop expired leases so the table doesn't grow without bound"""
+        with self._lock:
+            cursor = self._db.execute('DELETE FROM leases WHERE expires_at <= ?', (time.time(),))
+            return cursor.rowcount
+
+    def _held(self, message_ids: List[str]) -> set:
+        held = set()
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(message_ids), 500):
+            chunk = message_ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._db.execute(
+                f'SELECT message_id FROM leases WHERE owner = ? AND message_id IN ({placeholders})',
+                [self.owner] + chunk
+            )
+            held.update(row[0] for row in rows)
+        return held
+
+
+def lease_keys(emails: List[EmailRecord]) -> List[str]:
+    """Message and thread IDs to lease for emails, without duplicates"""
+    return list(dict.fromkeys(k for e in emails for k in (e.id, e.thread_id) if k))
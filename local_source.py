@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Classify exported mailboxes (mbox, Maildir, .eml directories) without the Gmail API"""
+
+import os
+import sys
+import json
+import time
+import email
+import logging
+import mailbox
+import argparse
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Tuple
+
+from backends import create_backend
+from classifier import GroqClassifier
+from email_record import EmailRecord
+from gmail_client import email_from_mime
+from rate_limiter import RateLimiter
+from results_store import ResultStore
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()
+    ]
+)
+
+
+def iter_raw(path: str) -> Iterator[Tuple[str, bytes]]:
+    """Yield (source key, raw RFC 822 bytes) from an mbox file, Maildir or .eml tree
+
+    Parsing is left to the caller so it can happen in worker processes.
+    """
+    if os.path.isdir(path):
+        if all(os.path.isdir(os.path.join(path, sub)) for sub in ('cur', 'new', 'tmp')):
+            box = mailbox.Maildir(path, factory=None, create=False)
+            for key in box.iterkeys():
+                yield key, box.get_bytes(key)
+            return
+        for root, _, files in sorted(os.walk(path)):
+            for name in sorted(files):
+                if name.endswith('.eml'):
+                    file_path = os.path.join(root, name)
+                    with open(file_path, 'rb') as f:
+                        yield os.path.relpath(file_path, path), f.read()
+    elif path.endswith('.eml'):
+        with open(path, 'rb') as f:
+            yield os.path.basename(path), f.read()
+    else:
+        box = mailbox.mbox(path, factory=None, create=False)
+        for key in box.iterkeys():
+            yield str(key), box.get_bytes(key)
+
+
+def parse_message(data: bytes, key: str, body_chars: int = None) -> EmailRecord:
+    """EmailRecord from raw bytes via the same body extraction as Gmail mail
+
+    The Message-ID header is used as the ID when present, the source key otherwise.
+    """
+    message = email.message_from_bytes(data)
+    # Folded or non-ASCII headers come back as Header objects
+    message_id = str(message.get('Message-ID') or '').strip().strip('<>') or key
+    return email_from_mime(message, message_id, body_chars)
+
+
+def iter_messages(path: str, body_chars: int = None) -> Iterator[EmailRecord]:
+    """Parsed records from a local mailbox, streamed one at a time"""
+    for key, data in iter_raw(path):
+        yield parse_message(data, key, body_chars)
+
+
+# Per worker process, set up by _init_worker
+_classifier = None
+
+
+def _init_worker(backend_name: str, workers: int):
+    global _classifier
+    if os.getenv('CLASSIFIER_DAEMON_URL') and not backend_name:
+        # The daemon already enforces one budget for everyone
+        _classifier = GroqClassifier()
+        return
+    backend = create_backend(backend_name)
+    # Each process gets its share of the backend's request budget
+    _classifier = GroqClassifier(
+        backend=backend,
+        rate_limiter=RateLimiter(backend.requests_per_minute / workers)
+    )
+
+
+def _classify_chunk(chunk: List[Tuple[str, bytes]]) -> List[Dict]:
+    """Parse and classify raw messages in a worker, one output row each"""
+    records, errors = {}, {}
+    for key, data in chunk:
+        try:
+            records[key] = parse_message(data, key)
+        except Exception as e:
+            # Written as an error row, so --resume tries it again instead of the run stopping
+            errors[key] = f"Could not parse message: {e}"
+    # The whole chunk is one request when classifying through the daemon
+    results = dict(zip(records, _classifier.classify_batch(list(records.values())))) if records else {}
+
+    rows = []
+    for key, _ in chunk:
+        record = records.get(key) or EmailRecord(id=key, subject='', sender='', date='', snippet='')
+        row = {'source_key': key, 'message_id': record.id, 'subject': record.subject,
+               'sender': record.sender, 'date': record.date, 'snippet': record.snippet}
+        row.update(results[key] if key in records else {'error': errors[key]})
+        rows.append(row)
+    return rows
+
+
+def _chunks(items: Iterator, size: int) -> Iterator[List]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Classify a local mailbox export at CPU speed')
+    parser.add_argument('path', help='mbox file, Maildir directory, .eml file or directory of .eml files')
+    parser.add_argument('--out', default='classified.jsonl', help='JSONL output file (default: classified.jsonl)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes (default: one per CPU)')
+    parser.add_argument('--backend', help='Backend to use (default: CLASSIFIER_BACKEND, or the daemon if configured)')
+    parser.add_argument('--chunk', type=int, default=20, help='Messages per task (default: 20)')
+    parser.add_argument('--limit', type=int, help='Only classify the first N messages')
+    parser.add_argument('--resume', action='store_true', help='Skip messages already classified in --out, retrying failed ones')
+    parser.add_argument('--store', action='store_true', help='Also append results to the Parquet result store')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    done = set()
+    if args.resume and os.path.exists(args.out):
+        with open(args.out) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        # Failed rows (429s, open circuit) are dropped and their messages tried again
+        kept = [row for row in rows if 'error' not in row]
+        done = {row['source_key'] for row in kept}
+        if len(kept) < len(rows):
+            tmp_path = args.out + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.writelines(json.dumps(row) + '\n' for row in kept)
+            os.replace(tmp_path, args.out)
+
+    print("🚀 Job Email Classifier - Local Mailbox")
+    print("=" * 50)
+    print(f"📂 {args.path} → {args.out} with {args.workers} workers")
+    if done:
+        print(f"⏯️  Skipping {len(done)} messages already classified")
+    print("=" * 50)
+
+    messages = ((key, data) for key, data in iter_raw(args.path) if key not in done)
+    if args.limit:
+        messages = itertools.islice(messages, args.limit)
+
+    if not (os.getenv('CLASSIFIER_DAEMON_URL') and not args.backend):
+        # Fail here rather than in every worker's initializer
+        try:
+            create_backend(args.backend)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+
+    result_store = ResultStore() if args.store else None
+    counts = {'emails': 0, 'errors': 0}
+    started = time.monotonic()
+
+    pool = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                               initargs=(args.backend, args.workers))
+    # Bounded look-ahead so a huge mbox is never held in memory at once
+    pending = deque()
+    tasks = _chunks(messages, args.chunk)
+    try:
+        with open(args.out, 'a' if args.resume else 'w') as out:
+            while True:
+                while len(pending) < args.workers * 2:
+                    chunk = next(tasks, None)
+                    if chunk is None:
+                        break
+                    pending.append(pool.submit(_classify_chunk, chunk))
+                if not pending:
+                    break
+
+                for row in pending.popleft().result():
+                    stats = row.pop('stats', {})
+                    row.update(model=stats.get('model', ''), prompt_tokens=stats.get('prompt_tokens', 0),
+                               completion_tokens=stats.get('completion_tokens', 0))
+                    out.write(json.dumps(row) + '\n')
+                    counts['emails'] += 1
+                    if 'error' in row:
+                        counts['errors'] += 1
+                    elif result_store:
+                        record = EmailRecord(id=row['message_id'], subject=row['subject'], sender=row['sender'],
+                                             date=row['date'], snippet=row['snippet'])
+                        result_store.append(record, row['category'], row['confidence'], row['reason'], stats)
+
+                if counts['emails'] % 1000 < args.chunk:
+                    rate = counts['emails'] / (time.monotonic() - started)
+                    logging.info(f"📊 {counts['emails']} emails ({rate:.0f}/s), {counts['errors']} errors")
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping - rerun with --resume to continue")
+        pool.shutdown(wait=False, cancel_futures=True)
+        sys.exit(1)
+    except BrokenProcessPool as e:
+        print(f"❌ Worker failed: {e}")
+        sys.exit(1)
+    finally:
+        pool.shutdown(wait=True)
+        if result_store:
+            result_store.flush()
+
+    elapsed = time.monotonic() - started
+    print(f"✅ Classified {counts['emails']} emails in {elapsed:.1f}s "
+          f"({counts['emails'] / elapsed if elapsed else 0:.0f}/s), {counts['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Local compressed cache of fetched messages, so the same mail is downloaded once"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from typing import Optional
+
+from email_record import EmailRecord, body_char_budget
+
+
+class MessageStore:
+    """EmailRecords keyed by message ID, zlib-compressed in SQLite
+
+    Gmail message content never changes, so a cached copy is always valid;
+    only labels do, and those are not stored here. The file is capped at
+    MESSAGE_STORE_MAX_MB, evicting the least recently read messages first.
+    """
+
+    # Check the size cap every this many writes rather than on each one
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str = None, max_mb: float = None):
+        self.path = path or os.getenv('MESSAGE_STORE', 'messages.db')
+        self.max_bytes = int((max_mb if max_mb is not None else float(os.getenv('MESSAGE_STORE_MAX_MB', '200'))) * 2**20)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                message_id TEXT PRIMARY KEY,
+                body_chars INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            )
+        ''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS messages_accessed ON messages (accessed)')
+
+    def get(self, message_id: str, body_chars: int = None) -> Optional[EmailRecord]:
+        """Cached record, or None if missing or stored with a smaller body budget"""
+        budget = body_char_budget() if body_chars is None else body_chars
+        with self._lock:
+            row = self._db.execute(
+                'SELECT body_chars, data FROM messages WHERE message_id = ?', (message_id,)
+            ).fetchone()
+            if row is None or row[0] < budget:
+                self.misses += 1
+                return None
+            with self._db:
+                self._db.execute('UPDATE messages SET accessed = ? WHERE message_id = ?', (time.time(), message_id))
+            self.hits += 1
+
+        data = json.loads(zlib.decompress(row[1]))
+        return EmailRecord.create(**data, body_chars=budget)
+
+    def put(self, email: EmailRecord, body_chars: int = None):
+        """Store a freshly fetched record; body_chars is the budget it was cut to"""
+        budget = body_char_budget() if body_chars is None else body_chars
+        # Thread history describes the conversation at fetch time, not the message
+        data = zlib.compress(json.dumps(email.to_dict() | {'history': ''}).encode('utf-8'))
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO messages (message_id, body_chars, data, size, accessed) VALUES (?, ?, ?, ?, ?)',
+                (email.id, budget, data, len(data), time.time())
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently read messages until the store is under 90% of its cap"""
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM messages').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for message_id, size in self._db.execute('SELECT message_id, size FROM messages ORDER BY accessed'):
+            doomed.append((message_id,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany('DELETE FROM messages WHERE message_id = ?', doomed)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
@@ -0,0 +1,61 @@
+"""Gmail search prefilters that keep known clutter out of the classifier"""
+
+import os
+from typing import List, Optional
+
+
+def _env_list(name: str) -> List[str]:
+    return [item.strip() for item in os.getenv(name, '').split(',') if item.strip()]
+
+
+class QueryBuilder:
+    """Adds server-side exclusions to a Gmail search query
+
+    Only mail excluded by Gmail category or by sender is considered safe to
+    bulk-label as clutter. Self-sent, recipient, size and has: exclusions are
+    simply skipped and stay unlabeled, even when they also match a clutter rule.
+    """
+
+    def __init__(self, exclude_categories: List[str] = None, exclude_from: List[str] = None,
+                 exclude_to: List[str] = None, exclude_self: bool = None,
+                 larger_than: str = None, exclude_has: List[str] = None):
+        # Gmail tabs: promotions, social, forums, updates, primary
+        self.exclude_categories = exclude_categories if exclude_categories is not None else _env_list('PREFILTER_CATEGORIES')
+        self.exclude_from = exclude_from if exclude_from is not None else _env_list('PREFILTER_FROM')
+        self.exclude_to = exclude_to if exclude_to is not None else _env_list('PREFILTER_TO')
+        self.exclude_self = exclude_self if exclude_self is not None else os.getenv('PREFILTER_SELF', 'false').lower() == 'true'
+        # Gmail size syntax, e.g. "5M" skips anything larger than 5 MB
+        self.larger_than = larger_than or os.getenv('PREFILTER_LARGER_THAN') or None
+        # e.g. "userlabels" skips mail the user already filed themselves
+        self.exclude_has = exclude_has if exclude_has is not None else _env_list('PREFILTER_EXCLUDE_HAS')
+
+    def _clutter_terms(self) -> List[str]:
+        return ([f'category:{c}' for c in self.exclude_categories] +
+                [f'from:{_quote(s)}' for s in self.exclude_from])
+
+    def _skip_terms(self) -> List[str]:
+        terms = [f'to:{_quote(r)}' for r in self.exclude_to]
+        if self.exclude_self:
+            terms.append('from:me')
+        if self.larger_than:
+            terms.append(f'larger:{self.larger_than}')
+        terms += [f'has:{h}' for h in self.exclude_has]
+        return terms
+
+    def build(self, base_query: str) -> str:
+        """base_query with every configured exclusion applied"""
+        exclusions = ' '.join(f'-{term}' for term in self._clutter_terms() + self._skip_terms())
+        return f'{base_query} {exclusions}'.strip()
+
+    def clutter_query(self, base_query: str) -> Optional[str]:
+        """Query for the mail build() excluded as known clutter, None if nothing qualifies"""
+        terms = self._clutter_terms()
+        if not terms:
+            return None
+        # {a b} is Gmail's OR group; skip exclusions win, so that mail stays unlabeled
+        skips = ' '.join(f'-{term}' for term in self._skip_terms())
+        return f'{base_query} {{{" ".join(terms)}}} {skips}'.strip()
+
+
+def _quote(value: str) -> str:
+    return f'"{value}"' if ' ' in value else value
@@ -0,0 +1,67 @@
+"""Shared request budget for LLM calls"""
+
+import os
+import time
+import threading
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls evenly under a per-minute budget"""
+    
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+    
+    def acquire(self):
+        """Block until the caller may make one request"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Stops calls after repeated failures, then lets one trial call through after a cooldown"""
+    
+    def __init__(self, failure_threshold: int = None, cooldown_seconds: float = None):
+        self.failure_threshold = failure_threshold or int(os.getenv('BREAKER_FAILURES', '5'))
+        self.cooldown_seconds = cooldown_seconds or float(os.getenv('BREAKER_COOLDOWN_SECONDS', '120'))
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+    
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+    
+    def allow(self) -> bool:
+        """Whether a call may be attempted right now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self.cooldown_seconds:
+                return False
+            # Half-open: one trial call decides whether to close again
+            self._trial_in_flight = True
+            return True
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    print(f"🔌 Circuit open after {self._failures} failures, pausing calls for {self.cooldown_seconds:.0f}s")
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""Append-only Parquet store for classification results"""
+
+import os
+import glob
+import time
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from email_record import EmailRecord
+
+SCHEMA = pa.schema([
+    ('message_id', pa.string()),
+    ('thread_id', pa.string()),
+    ('sender', pa.string()),
+    ('subject', pa.string()),
+    ('snippet', pa.string()),
+    # Date header as sent, e.g. 'Mon, 19 Oct 2026 10:00:00 +0000'
+    ('date', pa.string()),
+    ('category', pa.string()),
+    ('confidence', pa.float32()),
+    ('reason', pa.string()),
+    ('model', pa.string()),
+    # Hash of the prompt settings in force (GroqClassifier.prompt_version)
+    ('prompt_version', pa.string()),
+    ('latency_ms', pa.float32()),
+    ('prompt_tokens', pa.int32()),
+    ('completion_tokens', pa.int32()),
+    ('classified_at', pa.timestamp('ms', tz='UTC')),
+    # One entry per cascade tier that ran, in order
+    ('tiers', pa.list_(pa.struct([
+        ('model', pa.string()),
+        ('category', pa.string()),
+        ('confidence', pa.float32()),
+        ('escalated', pa.bool_()),
+    ]))),
+])
+
+
+class ResultStore:
+    """Buffers classification records and writes them as immutable Parquet parts"""
+
+    def __init__(self, path: str = None, row_group_size: int = None, compact_parts: int = None):
+        self.path = path or os.getenv('RESULTS_DIR', 'results')
+        self.row_group_size = row_group_size or int(os.getenv('RESULTS_ROW_GROUP_SIZE', '500'))
+        # Every flush adds a part; merge them once there are more than this (0 disables)
+        self.compact_parts = compact_parts if compact_parts is not None else int(os.getenv('RESULTS_COMPACT_PARTS', '50'))
+        self._buffer: List[Dict] = []
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def append(self, email: EmailRecord, category: str, confidence: float, reason: str,
+               stats: Optional[Dict] = None):
+        """Buffer one classification record, flushing once a row group is full"""
+        stats = stats or {}
+        record = {
+            'message_id': email.id,
+            'thread_id': email.thread_id,
+            'sender': email.sender,
+            'subject': email.subject,
+            'snippet': email.snippet,
+            'date': email.date,
+            'category': category,
+            'confidence': confidence,
+            'reason': reason,
+            'model': stats.get('model', ''),
+            'prompt_version': stats.get('prompt_version', ''),
+            'latency_ms': stats.get('latency_ms', 0.0),
+            'prompt_tokens': stats.get('prompt_tokens', 0),
+            'completion_tokens': stats.get('completion_tokens', 0),
+            'classified_at': datetime.now(timezone.utc),
+            'tiers': stats.get('tiers', []),
+        }
+
+        with self._lock:
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.row_group_size
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write buffered records as a new part file, returns rows written"""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        if not records:
+            return 0
+
+        self._write_part(pa.Table.from_pylist(records, schema=SCHEMA))
+        if self.compact_parts and len(self.parts()) > self.compact_parts:
+            self.compact()
+        return len(records)
+
+    def _write_part(self, table: pa.Table):
+        """Write a table atomically so readers never see a half-written part"""
+        name = _part_name()
+        # Dot-prefixed files are ignored by pyarrow.dataset until renamed
+        tmp_path = os.path.join(self.path, f".{name}.tmp")
+        pq.write_table(table, tmp_path, row_group_size=self.row_group_size, compression='zstd')
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    def parts(self) -> List[str]:
+        """List committed part files, oldest first"""
+        return sorted(glob.glob(os.path.join(self.path, 'part-*.parquet')))
+
+    def scan(self, columns: List[str], filter=None, paths: List[str] = None) -> Iterator[pa.RecordBatch]:
+        """Stream record batches for the requested columns only, from paths or all parts"""
+        paths = paths if paths is not None else self.parts()
+        if not paths:
+            return iter(())
+        dataset = ds.dataset(paths, schema=SCHEMA, format='parquet')
+        return dataset.to_batches(columns=columns, filter=filter)
+
+    def compact(self) -> int:
+        """Merge all parts into a single file, streaming one batch at a time
+
+        Returns the number of parts merged, 0 if another process is already compacting.
+        """
+        # Two processes merging the same parts would duplicate every row
+        lock_path = os.path.join(self.path, '.compact.lock')
+        try:
+            lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                # A lock left behind by a crashed process expires
+                if time.time() - os.path.getmtime(lock_path) > 600:
+                    os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+            return 0
+
+        try:
+            old_parts = self.parts()
+            if len(old_parts) < 2:
+                return 0
+
+            name = _part_name()
+            tmp_path = os.path.join(self.path, f".{name}.tmp")
+
+            dataset = ds.dataset(old_parts, schema=SCHEMA, format='parquet')
+            with pq.ParquetWriter(tmp_path, SCHEMA, compression='zstd') as writer:
+                for batch in dataset.to_batches(batch_size=self.row_group_size):
+                    writer.write_batch(batch, row_group_size=self.row_group_size)
+
+            os.replace(tmp_path, os.path.join(self.path, name))
+            for part in old_parts:
+                os.remove(part)
+            return len(old_parts)
+        finally:
+            os.close(lock)
+            os.remove(lock_path)
+
+
+def _part_name() -> str:
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    return f"part-{stamp}-{os.getpid()}-{threading.get_ident()}.parquet"
+
+
+def _category_filter(category: Optional[str]):
+    return ds.field('category') == category if category else None
+
+
+def count_by_sender(store: ResultStore, category: str = None) -> Counter:
+    """Count records per sender"""
+    counts = Counter()
+    for batch in store.scan(['sender'], _category_filter(category)):
+        for row in pc.value_counts(batch.column('sender')).to_pylist():
+            counts[row['values']] += row['counts']
+    return counts
+
+
+def confidence_histogram(store: ResultStore, bins: int = 10, category: str = None) -> List[int]:
+    """Histogram of confidence scores in equal-width bins over [0, 1]"""
+    histogram = [0] * bins
+    for batch in store.scan(['confidence'], _category_filter(category)):
+        scaled = pc.floor(pc.multiply(pc.fill_null(batch.column('confidence'), 0.0), bins))
+        for row in pc.value_counts(scaled).to_pylist():
+            index = min(max(int(row['values']), 0), bins - 1)
+            histogram[index] += row['counts']
+    return histogram
+
+
+def count_by_day(store: ResultStore, category: str = None) -> Counter:
+    """Count records per UTC day"""
+    counts = Counter()
+    for batch in store.scan(['classified_at'], _category_filter(category)):
+        days = pc.strftime(batch.column('classified_at'), format='%Y-%m-%d')
+        for row in pc.value_counts(days).to_pylist():
+            counts[row['values']] += row['counts']
+    return counts
+
+
+def cascade_summary(store: ResultStore) -> Dict[str, Dict]:
+    """Volume, latency and tokens for emails settled by the first tier vs escalated"""
+    summary = {
+        'first_tier': {'emails': 0, 'latency_ms': 0.0, 'tokens': 0},
+        'escalated': {'emails': 0, 'latency_ms': 0.0, 'tokens': 0},
+    }
+    columns = ['tiers', 'latency_ms', 'prompt_tokens', 'completion_tokens']
+    for batch in store.scan(columns):
+        escalated = pc.greater(pc.fill_null(pc.list_value_length(batch.column('tiers')), 0), 1)
+        tokens = pc.add(batch.column('prompt_tokens'), batch.column('completion_tokens'))
+        for key, mask in (('escalated', escalated), ('first_tier', pc.invert(escalated))):
+            summary[key]['emails'] += pc.sum(pc.cast(mask, pa.int64())).as_py() or 0
+            summary[key]['latency_ms'] += pc.sum(pc.filter(batch.column('latency_ms'), mask)).as_py() or 0.0
+            summary[key]['tokens'] += pc.sum(pc.filter(tokens, mask)).as_py() or 0
+    return summary
+
+
+def latest_by(store: ResultStore, key: str = 'message_id') -> Dict[str, Dict]:
+    """Most recent record per message (or per thread with key='thread_id')"""
+    latest = {}
+    columns = ['message_id', 'thread_id', 'category', 'model', 'prompt_version', 'classified_at']
+    for batch in store.scan(columns):
+        for row in batch.to_pylist():
+            current = latest.get(row[key])
+            if row[key] and (current is None or row['classified_at'] > current['classified_at']):
+                latest[row[key]] = row
+    return latest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Query stored classification results')
+    parser.add_argument('report', choices=['senders', 'confidence', 'daily', 'cascade', 'compact'],
+                        help='Aggregation to run (or compact to merge part files)')
+    parser.add_argument('--dir', help='Results directory (default: RESULTS_DIR or ./results)')
+    parser.add_argument('--category', help='Only include this category')
+    parser.add_argument('--top', type=int, default=20, help='Number of senders to show')
+    parser.add_argument('--bins', type=int, default=10, help='Confidence histogram bins')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store = ResultStore(path=args.dir)
+
+    if args.report == 'compact':
+        merged = store.compact()
+        print(f"✅ Merged {merged} part files")
+    elif args.report == 'senders':
+        for sender, count in count_by_sender(store, args.category).most_common(args.top):
+            print(f"{count:>7}  {sender}")
+    elif args.report == 'confidence':
+        histogram = confidence_histogram(store, args.bins, args.category)
+        width = max(histogram) or 1
+        for i, count in enumerate(histogram):
+            low, high = i / args.bins, (i + 1) / args.bins
+            print(f"{low:.2f}-{high:.2f} {count:>7}  {'█' * int(40 * count / width)}")
+    elif args.report == 'cascade':
+        for tier, stats in cascade_summary(store).items():
+            emails = stats['emails'] or 1
+            print(f"{tier:<12} {stats['emails']:>7} emails  "
+                  f"{stats['latency_ms'] / emails:>8.0f} ms/email  {stats['tokens'] / emails:>7.0f} tokens/email")
+    elif args.report == 'daily':
+        for day, count in sorted(count_by_day(store, args.category).items()):
+            print(f"{day}  {count:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Persistent queue of emails whose classification failed and should be retried later"""
+
+import os
+import time
+import sqlite3
+import threading
+from typing import List, Optional
+
+
+class RetryQueue:
+    """Message IDs with their next retry time, stored in a local SQLite database
+
+    Deferred emails stay unlabeled in Gmail, so they keep matching the
+    unlabeled query; the queue only decides when they may be tried again.
+    The background service, Streamlit sessions and backfill share the file,
+    so mail deferred by one is retried by another. Each entry also records
+    its thread so thread mode can look entries up by conversation.
+
+    After RETRY_MAX_ATTEMPTS failures an entry is kept as abandoned, so the
+    email is skipped from then on instead of starting over at attempt 1.
+    Classifying it successfully (e.g. from the web app) clears it.
+    """
+
+    def __init__(self, path: str = None, base_delay: float = 60, max_delay: float = 6 * 3600,
+                 max_attempts: int = None):
+        self.path = path or os.getenv('RETRY_QUEUE_DB', 'retry_queue.db')
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts or int(os.getenv('RETRY_MAX_ATTEMPTS', '20'))
+        self._lock = threading.Lock()
+
+        # Autocommit mode; transactions are opened explicitly below
+        self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS retries (
+                message_id TEXT PRIMARY KEY,
+                thread_id TEXT NOT NULL DEFAULT '',
+                attempts INTEGER NOT NULL,
+                next_retry REAL NOT NULL,
+                error TEXT,
+                abandoned INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS retries_thread ON retries (thread_id)')
+
+    def __len__(self) -> int:
+        """Emails still due to be retried (abandoned ones excluded)"""
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM retries WHERE abandoned = 0').fetchone()[0]
+
+    def __contains__(self, message_id: str) -> bool:
+        with self._lock:
+            return self._db.execute(
+                'SELECT 1 FROM retries WHERE message_id = ?', (message_id,)
+            ).fetchone() is not None
+
+    def defer(self, message_id: str, error: str, thread_id: str = '') -> bool:
+        """Schedule a retry with exponential backoff, returns False once the email is abandoned"""
+        with self._lock:
+            # Read and write in one transaction so concurrent processes don't lose attempts
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(
+                    'SELECT attempts FROM retries WHERE message_id = ?', (message_id,)
+                ).fetchone()
+                attempts = (row[0] if row else 0) + 1
+                abandoned = attempts > self.max_attempts
+
+                delay = min(self.base_delay * (2 ** (attempts - 1)), self.max_delay)
+                self._db.execute(
+                    'INSERT OR REPLACE INTO retries (message_id, thread_id, attempts, next_retry, error, abandoned) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (message_id, thread_id, attempts, time.time() + delay, error[:200], int(abandoned))
+                )
+                self._db.execute('COMMIT')
+                return not abandoned
+            except sqlite3.Error:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def is_waiting(self, key: str, thread: bool = False) -> bool:
+        """True if the email (or, with thread=True, any email in the thread) is still backing off"""
+        column = 'thread_id' if thread else 'message_id'
+        with self._lock:
+            return self._db.execute(
+                f'SELECT 1 FROM retries WHERE {column} = ? AND abandoned = 0 AND next_retry > ? LIMIT 1',
+                (key, time.time())
+            ).fetchone() is not None
+
+    def is_abandoned(self, message_id: str) -> bool:
+        """True once the email has failed RETRY_MAX_ATTEMPTS times"""
+        with self._lock:
+            return self._db.execute(
+                'SELECT 1 FROM retries WHERE message_id = ? AND abandoned = 1', (message_id,)
+            ).fetchone() is not None
+
+    def abandoned_count(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM retries WHERE abandoned = 1').fetchone()[0]
+
+    def due(self, threads: bool = False, limit: int = None) -> List[str]:
+        """Message IDs (or their thread IDs) whose retry time has passed, longest overdue first"""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT message_id, thread_id FROM retries WHERE abandoned = 0 AND next_retry <= ? '
+                'ORDER BY next_retry LIMIT ?',
+                (time.time(), limit if limit is not None else -1)
+            ).fetchall()
+        if threads:
+            return list(dict.fromkeys(thread_id for _, thread_id in rows if thread_id))
+        return [message_id for message_id, _ in rows]
+
+    def defer_thread(self, thread_id: str, error: str):
+        """Back off every queued email in a thread, e.g. when the thread can't be fetched"""
+        with self._lock:
+            message_ids = [row[0] for row in self._db.execute(
+                'SELECT message_id FROM retries WHERE thread_id = ? AND abandoned = 0', (thread_id,)
+            )]
+        for message_id in message_ids:
+            self.defer(message_id, error, thread_id)
+
+    def next_retry(self, message_ids: List[str]) -> Optional[float]:
+        """Earliest retry time (epoch seconds) among message_ids still queued, None if none are"""
+        times = []
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                times.append(self._db.execute(
+                    f'SELECT MIN(next_retry) FROM retries WHERE abandoned = 0 AND message_id IN ({placeholders})',
+                    chunk
+                ).fetchone()[0])
+        times = [t for t in times if t is not None]
+        return min(times) if times else None
+
+    def resolve(self, message_id: str, thread_id: str = ''):
+        """Forget an email once it has been classified, or every email in thread_id once it is labeled"""
+        with self._lock:
+            self._db.execute('DELETE FROM retries WHERE message_id = ?', (message_id,))
+            if thread_id:
+                self._db.execute('DELETE FROM retries WHERE thread_id = ?', (thread_id,))
@@ -0,0 +1,102 @@
+"""Priority ordering and per-cycle time budget for classification"""
+
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Set
+
+from email_record import EmailRecord
+
+# Subject phrases that usually mean followup_required, with their weights
+ACTION_KEYWORDS = {
+    'interview': 3.0,
+    'offer': 3.0,
+    'phone screen': 3.0,
+    'next steps': 2.5,
+    'assessment': 2.0,
+    'availability': 2.0,
+    'schedule': 2.0,
+    'background check': 2.0,
+    'action required': 2.0,
+    'reference': 1.5,
+    'documents': 1.5,
+    'follow up': 1.0,
+    'application': 1.0,
+}
+
+# Subject phrases typical of job alerts and marketing
+CLUTTER_KEYWORDS = ('job alert', 'jobs for you', 'new jobs', 'recommended', 'newsletter',
+                    'digest', 'webinar', 'is hiring', 'and more')
+
+# Sender fragments that almost never need action
+CLUTTER_SENDERS = ('jobalerts-noreply', 'notifications@github', 'newsletter', 'marketing',
+                   'lensa.com', 'digest', 'promo')
+
+
+def priority_score(email: EmailRecord) -> float:
+    """Cheap estimate of how likely an email needs action, from headers only"""
+    subject = email.subject.lower()
+    sender = email.sender.lower()
+    score = 0.0
+
+    score += sum(weight for phrase, weight in ACTION_KEYWORDS.items() if phrase in subject)
+    if any(phrase in subject for phrase in CLUTTER_KEYWORDS):
+        score -= 3.0
+    if any(fragment in sender for fragment in CLUTTER_SENDERS):
+        score -= 3.0
+    elif 'noreply' not in sender and 'no-reply' not in sender:
+        # A person (recruiter, hiring manager) rather than a system mailer
+        score += 1.0
+
+    # Newer mail first among equals, fading out over three days
+    try:
+        received = parsedate_to_datetime(email.date)
+        if received.tzinfo is None:
+            received = received.replace(tzinfo=timezone.utc)
+        age_hours = (datetime.now(timezone.utc) - received).total_seconds() / 3600
+        score += max(0.0, 1.0 - age_hours / 72)
+    except (TypeError, ValueError):
+        pass
+
+    return score
+
+
+class PriorityScheduler:
+    """Orders a cycle's emails by priority and stops the cycle at its time budget
+
+    Emails left when the budget runs out are carried over and sorted ahead of
+    everything else next cycle, so the deadline can't starve them behind a
+    steady stream of new high-priority mail.
+    """
+
+    def __init__(self, budget_seconds: float = None):
+        self.budget_seconds = budget_seconds or float(os.getenv('CYCLE_BUDGET_SECONDS', '600'))
+        self._deadline = None
+        self._carryover: List[str] = []
+        # IDs taken over for the current cycle, ordered first
+        self._carried: Set[str] = set()
+
+    def start_cycle(self):
+        self._deadline = time.monotonic() + self.budget_seconds
+
+    def out_of_time(self) -> bool:
+        return self._deadline is not None and time.monotonic() > self._deadline
+
+    def order(self, emails: List[EmailRecord]) -> List[EmailRecord]:
+        """Carried-over work first, then highest priority; stable so ties keep Gmail's newest-first order
+
+        Carried IDs are message IDs, or thread IDs in thread mode.
+        """
+        def key(email: EmailRecord):
+            carried = email.id in self._carried or email.thread_id in self._carried
+            return carried, priority_score(email)
+        return sorted(emails, key=key, reverse=True)
+
+    def carry_over(self, message_ids: List[str]):
+        self._carryover.extend(m for m in message_ids if m not in self._carryover)
+
+    def take_carryover(self) -> List[str]:
+        carried, self._carryover = self._carryover, []
+        self._carried = set(carried)
+        return carried
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""SQLite FTS5 search over classified emails, synced incrementally from the result store"""
+
+import os
+import re
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List
+
+from results_store import ResultStore
+
+COLUMNS = ['message_id', 'thread_id', 'sender', 'subject', 'snippet', 'date',
+           'reason', 'category', 'confidence', 'classified_at']
+
+
+def _received_ms(date_header: str, fallback: datetime) -> int:
+    """Date header as epoch ms, falling back to when the email was classified"""
+    try:
+        received = parsedate_to_datetime(date_header)
+        if received.tzinfo is None:
+            received = received.replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        received = fallback
+    return int(received.timestamp() * 1000)
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a prefix"""
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class SearchIndex:
+    """Latest classification per message, full-text indexed on subject, sender, snippet and reason
+
+    Built from the Parquet parts of a ResultStore; sync() only reads parts it
+    has not seen, so refreshing before each search is cheap. Searches never
+    touch Gmail.
+    """
+
+    def __init__(self, store: ResultStore, path: str = None):
+        self.store = store
+        self.path = path or os.getenv('SEARCH_INDEX', 'search.db')
+        self._lock = threading.Lock()
+
+        # Autocommit mode; transactions are opened explicitly below
+        self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS emails (
+                id INTEGER PRIMARY KEY,
+                message_id TEXT UNIQUE NOT NULL,
+                thread_id TEXT,
+                sender TEXT,
+                subject TEXT,
+                snippet TEXT,
+                date TEXT,
+                reason TEXT,
+                category TEXT,
+                confidence REAL,
+                received_at INTEGER,
+                classified_at INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS emails_received ON emails (received_at);
+            CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+                subject, sender, snippet, reason,
+                content='emails', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TABLE IF NOT EXISTS synced_parts (name TEXT PRIMARY KEY);
+        ''')
+
+    def sync(self) -> int:
+        """Index rows from parts not seen yet, returns rows read"""
+        parts = {os.path.basename(p): p for p in self.store.parts()}
+        with self._lock:
+            synced = {row[0] for row in self._db.execute('SELECT name FROM synced_parts')}
+        new_parts = [parts[name] for name in sorted(parts) if name not in synced]
+        if not new_parts:
+            return 0
+
+        rows = 0
+        for batch in self.store.scan(COLUMNS, paths=new_parts):
+            # Read and write in one transaction, so the CLI and the app syncing at the
+            # same time can't both insert the same message
+            with self._lock:
+                self._db.execute('BEGIN IMMEDIATE')
+                try:
+                    for row in batch.to_pylist():
+                        self._upsert(row)
+                        rows += 1
+                    self._db.execute('COMMIT')
+                except sqlite3.Error:
+                    self._db.execute('ROLLBACK')
+                    raise
+
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                # Compaction replaces parts, so forget names that no longer exist
+                self._db.execute('DELETE FROM synced_parts')
+                self._db.executemany('INSERT INTO synced_parts (name) VALUES (?)', [(name,) for name in parts])
+                self._db.execute('COMMIT')
+            except sqlite3.Error:
+                self._db.execute('ROLLBACK')
+                raise
+        return rows
+
+    def _upsert(self, row: Dict):
+        """Keep only the newest classification of each message"""
+        classified_at = row['classified_at'] or datetime.fromtimestamp(0, timezone.utc)
+        classified_ms = int(classified_at.timestamp() * 1000)
+        existing = self._db.execute(
+            'SELECT id, subject, sender, snippet, reason, classified_at FROM emails WHERE message_id = ?',
+            (row['message_id'],)
+        ).fetchone()
+        if existing is not None:
+            if existing['classified_at'] >= classified_ms:
+                return
+            # External-content FTS tables need the old values to remove a row
+            self._db.execute(
+                "INSERT INTO emails_fts (emails_fts, rowid, subject, sender, snippet, reason) "
+                "VALUES ('delete', ?, ?, ?, ?, ?)",
+                (existing['id'], existing['subject'], existing['sender'], existing['snippet'], existing['reason'])
+            )
+            self._db.execute('DELETE FROM emails WHERE id = ?', (existing['id'],))
+
+        values = (row['message_id'], row['thread_id'], row['sender'], row['subject'], row['snippet'] or '',
+                  row['date'] or '', row['reason'], row['category'], row['confidence'],
+                  _received_ms(row['date'], classified_at), classified_ms)
+        cursor = self._db.execute(
+            'INSERT INTO emails (message_id, thread_id, sender, subject, snippet, date, reason, category, '
+            'confidence, received_at, classified_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            values
+        )
+        self._db.execute(
+            'INSERT INTO emails_fts (rowid, subject, sender, snippet, reason) VALUES (?, ?, ?, ?, ?)',
+            (cursor.lastrowid, row['subject'], row['sender'], row['snippet'] or '', row['reason'])
+        )
+
+    def search(self, text: str = '', categories: List[str] = None, since: datetime = None,
+               until: datetime = None, min_confidence: float = 0.0, limit: int = 100) -> List[Dict]:
+        """Matching emails, best match first (newest first without text)"""
+        conditions, params = [], []
+        if categories:
+            conditions.append(f"e.category IN ({','.join('?' * len(categories))})")
+            params += categories
+        if since:
+            conditions.append('e.received_at >= ?')
+            params.append(int(since.timestamp() * 1000))
+        if until:
+            conditions.append('e.received_at < ?')
+            params.append(int(until.timestamp() * 1000))
+        if min_confidence:
+            conditions.append('e.confidence >= ?')
+            params.append(min_confidence)
+
+        match = fts_query(text)
+        if match:
+            sql = ('SELECT e.* FROM emails_fts JOIN emails e ON e.id = emails_fts.rowid '
+                   'WHERE emails_fts MATCH ?')
+            params.insert(0, match)
+            order = 'bm25(emails_fts)'
+        else:
+            sql = 'SELECT e.* FROM emails e WHERE 1 = 1'
+            order = 'e.received_at DESC'
+        for condition in conditions:
+            sql += f' AND {condition}'
+        sql += f' ORDER BY {order} LIMIT ?'
+        params.append(limit)
+
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, params)]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM emails').fetchone()[0]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Search classified emails')
+    parser.add_argument('text', nargs='?', default='', help='Words to find in subject, sender, snippet or reason')
+    parser.add_argument('--dir', help='Results directory (default: RESULTS_DIR or ./results)')
+    parser.add_argument('--category', action='append', help='Only this category (repeatable)')
+    parser.add_argument('--since', help='Received on or after YYYY-MM-DD')
+    parser.add_argument('--min-confidence', type=float, default=0.0, help='Minimum confidence (0-1)')
+    parser.add_argument('--limit', type=int, default=20, help='Maximum results (default: 20)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    index = SearchIndex(ResultStore(path=args.dir))
+    synced = index.sync()
+    if synced:
+        print(f"🗂️  Indexed {synced} new results ({len(index)} emails)")
+
+    since = datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc) if args.since else None
+    for row in index.search(args.text, args.category, since=since,
+                            min_confidence=args.min_confidence, limit=args.limit):
+        print(f"{row['category']:<22} {row['confidence']:>4.0%}  {row['date'][:16]:<16}  "
+              f"{row['sender'][:30]:<30}  {row['subject'][:60]}")
+
+
+if __name__ == "__main__":
+    main()
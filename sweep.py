@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Reclassify labeled mail whose result came from an older model or prompt"""
+
+import os
+import time
+import logging
+import argparse
+import dataclasses
+from collections import Counter, defaultdict
+from typing import Dict, List, Set
+
+from gmail_client import GmailClient
+from classifier import ClassificationError, GroqClassifier
+from results_store import ResultStore, latest_by
+from usage_tracker import QuotaPlanner, UsageTracker
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('classifier.log'),
+        logging.StreamHandler()
+    ]
+)
+
+
+def find_outdated(store: ResultStore, models: Set[str], prompt_version: str,
+                  key: str = 'message_id') -> List[Dict]:
+    """Latest records not produced by one of models under prompt_version, newest first
+
+    Cheap-tier results (a different prompt) count as outdated too, so a
+    sweep upgrades them once quota allows.
+    """
+    outdated = [
+        row for row in latest_by(store, key).values()
+        if row['model'] not in models or row['prompt_version'] != prompt_version
+    ]
+    outdated.sort(key=lambda row: row['classified_at'], reverse=True)
+    return outdated
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Reclassify mail labeled under an older model or prompt')
+    parser.add_argument('--dir', help='Results directory (default: RESULTS_DIR or ./results)')
+    parser.add_argument('--limit', type=int, help='Reclassify at most N emails this run')
+    parser.add_argument('--batch-size', type=int, default=50, help='Emails per label update (default: 50)')
+    parser.add_argument('--threads', action='store_true',
+                        help='Results came from thread mode: reclassify and relabel whole threads')
+    parser.add_argument('--dry-run', action='store_true', help='Only show what is outdated')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    threads = args.threads or os.getenv('THREAD_MODE', 'false').lower() == 'true'
+    key = 'thread_id' if threads else 'message_id'
+
+    print("🚀 Job Email Classifier - Reclassification Sweep")
+    print("=" * 50)
+
+    try:
+        usage_tracker = UsageTracker()
+        classifier = GroqClassifier(usage_tracker=usage_tracker)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+
+    store = ResultStore(path=args.dir)
+    models = {m for m in (classifier.model, classifier.fast_model) if m}
+    version = classifier.prompt_version()
+    outdated = find_outdated(store, models, version, key)[:args.limit]
+
+    print(f"🤖 Current: {', '.join(sorted(models))}, prompt {version}")
+    print(f"🔁 {len(outdated)} {'threads' if threads else 'emails'} classified under older versions")
+    for (model, prompt_version), count in Counter(
+            (row['model'], row['prompt_version'] or '-') for row in outdated).most_common():
+        print(f"{count:>7}  {model} / prompt {prompt_version}")
+    print("=" * 50)
+
+    if args.dry_run or not outdated:
+        return
+
+    gmail_client = GmailClient()
+    if not gmail_client.authenticate():
+        print("❌ Gmail authentication failed")
+        return
+
+    label_ids = {}
+    for category, label_name in GroqClassifier.LABELS.items():
+        label_ids[category] = gmail_client.get_or_create_label(label_name)
+        if not label_ids[category]:
+            print(f"❌ Could not create label {label_name}")
+            return
+
+    planner = QuotaPlanner(usage_tracker)
+    swept = moved = failed = 0
+    started = time.monotonic()
+    try:
+        for start in range(0, len(outdated), args.batch_size):
+            batch = {row[key]: row for row in outdated[start:start + args.batch_size]}
+
+            # Fresh mail comes first; the sweep waits for quota instead
+            while planner.exhausted():
+                logging.warning("🪙 Daily token quota nearly used up, pausing sweep for 10 minutes")
+                time.sleep(600)
+
+            if threads:
+                emails = []
+                for summary in gmail_client.get_thread_summaries(list(batch)):
+                    fetched = gmail_client.get_emails([summary.id])
+                    if fetched:
+                        emails.append(dataclasses.replace(fetched[0], history=summary.history))
+            else:
+                emails = gmail_client.get_emails(list(batch))
+
+            # (old category, new category) -> IDs, so each move is one batchModify
+            moves = defaultdict(list)
+            for email in emails:
+                work_id = email.thread_id if threads else email.id
+                try:
+                    category, confidence, reason = classifier.classify_email(email)
+                except ClassificationError as e:
+                    logging.warning(f"⚠️ Skipping {email.subject[:50]}...: {e}")
+                    failed += 1
+                    continue
+
+                # Recorded even when unchanged, so the next sweep skips it
+                store.append(email, category, confidence, reason, classifier.last_stats)
+                swept += 1
+                old_category = batch[work_id]['category']
+                if category != old_category:
+                    moves[(old_category, category)].append(work_id)
+                    logging.info(f"🔀 {email.subject[:50]}... {old_category} → {category} ({confidence:.0%})")
+
+            for (old_category, category), ids in moves.items():
+                remove = [label_ids[old_category]] if old_category in label_ids else []
+                if threads:
+                    for thread_id in ids:
+                        gmail_client.label_thread(thread_id, label_ids[category], remove_label_ids=remove)
+                else:
+                    gmail_client.batch_modify(ids, add_label_ids=[label_ids[category]], remove_label_ids=remove)
+                moved += len(ids)
+
+            store.flush()
+            per_minute = swept / (time.monotonic() - started) * 60
+            logging.info(f"📊 {swept}/{len(outdated)} reclassified ({per_minute:.1f}/min), "
+                         f"{moved} relabeled, {failed} skipped")
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping - finished emails are recorded, rerun to continue")
+    finally:
+        store.flush()
+
+    print(f"✅ Sweep done: {swept} reclassified, {moved} changed category, {failed} skipped")
+
+
+if __name__ == "__main__":
+    main()
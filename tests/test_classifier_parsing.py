@@ -0,0 +1,43 @@
+"""Parsing of the compact JSON response format"""
+
+import pytest
+
+from backends import MockBackend
+from classifier import GroqClassifier
+
+
+@pytest.fixture
+def classifier():
+    return GroqClassifier(backend=MockBackend(), daemon_url='', response_format='json', reason_words=3)
+
+
+@pytest.mark.parametrize('response, category', [
+    ('{"c": "A", "p": 0.9, "r": "x"}', 'application_submitted'),
+    ('{"c": "f", "p": 0.9, "r": "x"}', 'followup_required'),
+    ('{"c": "O", "p": 0.9, "r": "x"}', 'other'),
+    ('{"c": "followup_required", "p": 0.9, "r": "x"}', 'followup_required'),
+])
+def test_category_codes(classifier, response, category):
+    assert classifier._parse_json_response(response)[0] == category
+
+
+def test_confidence_and_reason(classifier):
+    assert classifier._parse_json_response('{"c": "A", "p": 1, "r": "Thanks for applying to Acme"}') == \
+        ('application_submitted', 1.0, 'Thanks for applying')
+    assert classifier._parse_json_response('{"c": "O", "p": "0.25"}') == ('other', 0.25, 'No reason given')
+
+
+@pytest.mark.parametrize('response, message', [
+    ('CLASSIFICATION: other', 'not JSON'),
+    ('["A", 0.9]', 'not a JSON object'),
+    ('{"c": "X", "p": 0.9}', 'unknown category code'),
+    ('{"p": 0.9}', 'unknown category code'),
+    ('{"c": "A"}', 'missing or non-numeric confidence'),
+    ('{"c": "A", "p": "high"}', 'missing or non-numeric confidence'),
+    ('{"c": "A", "p": null}', 'missing or non-numeric confidence'),
+    ('{"c": "A", "p": 1.5}', 'out of range'),
+    ('{"c": "A", "p": -0.1}', 'out of range'),
+])
+def test_invalid_responses(classifier, response, message):
+    with pytest.raises(ValueError, match=message):
+        classifier._parse_json_response(response)
@@ -0,0 +1,64 @@
+"""LeaseManager against a temporary SQLite database"""
+
+import time
+
+from email_record import EmailRecord
+from leases import LeaseManager, lease_keys
+
+
+def _manager(tmp_path, owner, ttl=60):
+    return LeaseManager(str(tmp_path / 'leases.db'), ttl_seconds=ttl, owner=owner)
+
+
+def _email(message_id, thread_id):
+    return EmailRecord.create(id=message_id, thread_id=thread_id)
+
+
+def test_claim_keeps_callers_order(tmp_path):
+    leases = _manager(tmp_path, 'a')
+    assert leases.claim(['m3', 'm1', 'm2']) == ['m3', 'm1', 'm2']
+    assert leases.claim([]) == []
+
+
+def test_claim_skips_ids_held_by_another_owner(tmp_path):
+    first, second = _manager(tmp_path, 'a'), _manager(tmp_path, 'b')
+    assert first.claim(['m1', 'm2']) == ['m1', 'm2']
+    assert second.claim(['m1', 'm2', 'm3']) == ['m3']
+    # Our own leases are simply extended
+    assert first.claim(['m1']) == ['m1']
+
+
+def test_release_frees_ids_for_others(tmp_path):
+    first, second = _manager(tmp_path, 'a'), _manager(tmp_path, 'b')
+    first.claim(['m1', 'm2'])
+    # Releasing someone else's lease does nothing
+    second.release(['m1'])
+    assert second.claim(['m1']) == []
+    first.release(['m1'])
+    assert second.claim(['m1', 'm2']) == ['m1']
+
+
+def test_expired_leases_can_be_taken_and_purged(tmp_path):
+    first, second = _manager(tmp_path, 'a', ttl=0.01), _manager(tmp_path, 'b')
+    first.claim(['m1', 'm2'])
+    time.sleep(0.05)
+    assert second.claim(['m1']) == ['m1']
+    assert first.purge_expired() == 1
+
+
+def test_claim_emails_needs_message_and_thread(tmp_path):
+    first, second = _manager(tmp_path, 'a'), _manager(tmp_path, 'b')
+    # A thread-mode worker holds the whole conversation t1
+    first.claim(['t1'])
+    emails = [_email('m1', 't1'), _email('m2', 't2'), _email('m3', 't2')]
+    won = second.claim_emails(emails)
+    assert [e.id for e in won] == ['m2', 'm3']
+    # The partial claim on m1 was given back
+    assert first.claim(['m1']) == ['m1']
+
+
+def test_claim_emails_with_thread_id_equal_to_message_id(tmp_path):
+    leases = _manager(tmp_path, 'a')
+    emails = [_email('m1', 'm1'), _email('m2', 'm1')]
+    assert lease_keys(emails) == ['m1', 'm2']
+    assert [e.id for e in leases.claim_emails(emails)] == ['m1', 'm2']
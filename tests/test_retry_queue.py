@@ -0,0 +1,67 @@
+"""RetryQueue against a temporary SQLite database"""
+
+from retry_queue import RetryQueue
+
+
+def _queue(tmp_path, base_delay=0, max_attempts=3):
+    return RetryQueue(str(tmp_path / 'retry_queue.db'), base_delay=base_delay, max_attempts=max_attempts)
+
+
+def test_defer_backs_off(tmp_path):
+    queue = _queue(tmp_path, base_delay=3600)
+    assert queue.defer('m1', 'timeout', 't1')
+    assert 'm1' in queue and len(queue) == 1
+    assert queue.is_waiting('m1') and queue.is_waiting('t1', thread=True)
+    assert queue.due() == []
+    assert queue.next_retry(['m1', 'm2']) is not None
+    assert queue.next_retry(['m2']) is None
+
+
+def test_due_oldest_first_and_limited(tmp_path):
+    queue = _queue(tmp_path)
+    for message_id in ('m1', 'm2', 'm3'):
+        queue.defer(message_id, 'timeout', 't' + message_id)
+    assert queue.due() == ['m1', 'm2', 'm3']
+    assert queue.due(limit=2) == ['m1', 'm2']
+    assert queue.due(threads=True) == ['tm1', 'tm2', 'tm3']
+
+
+def test_abandoned_after_max_attempts(tmp_path):
+    queue = _queue(tmp_path, max_attempts=2)
+    assert queue.defer('m1', 'bad response')
+    assert queue.defer('m1', 'bad response')
+    assert not queue.defer('m1', 'bad response')
+    assert queue.is_abandoned('m1') and queue.abandoned_count() == 1
+    # Kept so it isn't started over, but no longer due
+    assert 'm1' in queue and len(queue) == 0
+    assert queue.due() == [] and not queue.is_waiting('m1')
+
+
+def test_attempts_are_shared_between_processes(tmp_path):
+    first, second = _queue(tmp_path, max_attempts=2), _queue(tmp_path, max_attempts=2)
+    first.defer('m1', 'timeout')
+    second.defer('m1', 'timeout')
+    assert not first.defer('m1', 'timeout')
+    assert second.is_abandoned('m1')
+
+
+def test_defer_thread(tmp_path):
+    queue = _queue(tmp_path, max_attempts=1)
+    queue.defer('m1', 'timeout', 't1')
+    queue.defer('m2', 'timeout', 't1')
+    queue.defer('m3', 'timeout', 't2')
+    queue.defer_thread('t1', 'Could not fetch thread')
+    assert queue.is_abandoned('m1') and queue.is_abandoned('m2')
+    assert queue.due() == ['m3']
+
+
+def test_resolve(tmp_path):
+    queue = _queue(tmp_path, max_attempts=1)
+    queue.defer('m1', 'timeout', 't1')
+    queue.defer('m2', 'timeout', 't1')
+    queue.defer('m2', 'timeout', 't1')
+    queue.resolve('m1')
+    assert 'm1' not in queue and 'm2' in queue
+    # Labeling the thread clears abandoned entries too
+    queue.resolve('m3', 't1')
+    assert 'm2' not in queue and queue.abandoned_count() == 0
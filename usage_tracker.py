@@ -0,0 +1,170 @@
+"""Token usage accounting and quota-aware planning of a cycle's backlog"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from email_record import EmailRecord
+from scheduler import priority_score
+
+
+class UsageTracker:
+    """Prompt and completion tokens per LLM call, in per-minute SQLite buckets
+
+    The database is shared by every process on the host (service, web app,
+    backfill, daemon), so rolling minute and 24-hour totals cover all of
+    them and survive restarts.
+    """
+
+    def __init__(self, path: str = None, daily_limit: int = None, minute_limit: int = None):
+        self.path = path or os.getenv('USAGE_DB', 'usage.db')
+        # 0 means unknown/unlimited
+        self.daily_limit = daily_limit if daily_limit is not None else int(os.getenv('DAILY_TOKEN_LIMIT', '0'))
+        self.minute_limit = minute_limit if minute_limit is not None else int(os.getenv('MINUTE_TOKEN_LIMIT', '0'))
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS usage (
+                minute INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                tier TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                calls INTEGER NOT NULL DEFAULT 0,
+                emails INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (minute, model, tier)
+            )
+        ''')
+        # A week is plenty for per-email cost estimates
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM usage WHERE minute < ?', (self._minute() - 7 * 1440,))
+
+    @staticmethod
+    def _minute() -> int:
+        return int(time.time() // 60)
+
+    def record(self, model: str, tier: str, prompt_tokens: int, completion_tokens: int, new_email: bool = False):
+        """Add one call's usage; new_email marks the first call made for an email"""
+        with self._lock, self._db:
+            self._db.execute('''
+                INSERT INTO usage (minute, model, tier, prompt_tokens, completion_tokens, calls, emails)
+                VALUES (?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT(minute, model, tier) DO UPDATE SET
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    completion_tokens = completion_tokens + excluded.completion_tokens,
+                    calls = calls + 1,
+                    emails = emails + excluded.emails
+            ''', (self._minute(), model, tier, prompt_tokens, completion_tokens, int(new_email)))
+
+    def tokens_since(self, minutes: int) -> int:
+        """Total tokens in the current minute and the minutes-1 before it"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT SUM(prompt_tokens + completion_tokens) FROM usage WHERE minute > ?',
+                (self._minute() - minutes,)
+            ).fetchone()
+        return row[0] or 0
+
+    def last_minute(self) -> int:
+        return self.tokens_since(1)
+
+    def last_day(self) -> int:
+        """Rolling 24-hour total, the window provider daily quotas use"""
+        return self.tokens_since(1440)
+
+    def remaining_today(self) -> Optional[int]:
+        """Tokens left in the rolling daily quota, None without DAILY_TOKEN_LIMIT"""
+        if not self.daily_limit:
+            return None
+        return max(0, self.daily_limit - self.last_day())
+
+    def tokens_per_email(self, tier: str) -> Optional[float]:
+        """Average tokens an email cost in this tier over the last week"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT SUM(prompt_tokens + completion_tokens), SUM(emails) FROM usage WHERE tier = ?',
+                (tier,)
+            ).fetchone()
+        return row[0] / row[1] if row[1] else None
+
+    def throttle(self):
+        """Wait for the next minute while this one is over MINUTE_TOKEN_LIMIT"""
+        while self.minute_limit and self.last_minute() >= self.minute_limit:
+            time.sleep(60 - time.time() % 60 + 0.1)
+
+    def summary(self) -> Dict:
+        return {
+            'last_minute': self.last_minute(),
+            'last_day': self.last_day(),
+            'daily_limit': self.daily_limit,
+            'remaining_today': self.remaining_today(),
+        }
+
+
+class QuotaPlanner:
+    """Decides per email whether it gets the full cascade, a cheap tier or waits
+
+    Projects the cycle's backlog against the remaining daily quota. While
+    everything fits, nothing changes; otherwise likely action-required mail
+    keeps the full tier and the rest drops to the cheap tier (one call, no
+    few-shot examples or escalation), and whatever still doesn't fit is left
+    for a later cycle. QUOTA_RESERVE of the daily limit is held back for mail
+    that arrives later in the day.
+    """
+
+    def __init__(self, tracker: UsageTracker, reserve: float = None, priority_threshold: float = None,
+                 default_email_tokens: float = None):
+        self.tracker = tracker
+        self.reserve = reserve if reserve is not None else float(os.getenv('QUOTA_RESERVE', '0.1'))
+        # Emails scoring at least this keep the full tier when quota is short
+        self.priority_threshold = (priority_threshold if priority_threshold is not None
+                                   else float(os.getenv('QUOTA_PRIORITY_THRESHOLD', '1.0')))
+        # Before any usage is recorded: roughly the default prompt plus the answer
+        self.default_email_tokens = default_email_tokens or float(os.getenv('TOKENS_PER_EMAIL_ESTIMATE', '1200'))
+
+    def estimate(self, tier: str) -> float:
+        measured = self.tracker.tokens_per_email(tier)
+        if measured:
+            return measured
+        # The cheap prompt drops the few-shot examples, roughly half the tokens
+        return self.default_email_tokens * (0.5 if tier == 'cheap' else 1.0)
+
+    def exhausted(self) -> bool:
+        """True once only the reserve is left, so bulk work should wait"""
+        remaining = self.tracker.remaining_today()
+        return remaining is not None and remaining <= self.reserve * self.tracker.daily_limit
+
+    def plan(self, emails: List[EmailRecord]) -> Dict[str, str]:
+        """Tier per email ID: 'full', 'cheap' or 'defer'; emails should be in priority order"""
+        remaining = self.tracker.remaining_today()
+        if remaining is None:
+            return {e.id: 'full' for e in emails}
+
+        budget = remaining - self.reserve * self.tracker.daily_limit
+        full_cost = self.estimate('full')
+        cheap_cost = self.estimate('cheap')
+        if len(emails) * full_cost <= budget:
+            return {e.id: 'full' for e in emails}
+
+        plan = {}
+        for email in emails:
+            important = priority_score(email) >= self.priority_threshold
+            if important and full_cost <= budget:
+                plan[email.id], budget = 'full', budget - full_cost
+            elif cheap_cost <= budget:
+                plan[email.id], budget = 'cheap', budget - cheap_cost
+            else:
+                plan[email.id] = 'defer'
+
+        tiers = list(plan.values())
+        logging.warning(
+            f"🪙 Backlog of {len(emails)} needs ~{len(emails) * full_cost:,.0f} tokens, "
+            f"{remaining:,} left today: {tiers.count('full')} full, {tiers.count('cheap')} cheap, "
+            f"{tiers.count('defer')} waiting for quota"
+        )
+        return plan